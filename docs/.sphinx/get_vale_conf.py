@@ -1,52 +1,158 @@
 #! /usr/bin/env python
 
-import requests
+"""Fetch the Canonical Vale styles, vocabulary and vale.ini from praecepta.
+
+Files are listed through the GitHub contents API and downloaded in parallel
+over one pooled session.  Every file is kept in a cache named by its git blob
+SHA, so files that did not change upstream are neither downloaded nor
+rewritten.  ``--ref`` pins a branch, tag or commit; ``--offline`` installs
+from the cache alone, which can be vendored with ``--cache-dir``.
+"""
+
+import argparse
+import hashlib
+import json
 import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 DIR = os.getcwd()
+REPO = "canonical/praecepta"
+TIMEOUT = 30
 
+# upstream directory -> local directory (relative to DIR)
+TARGETS = {
+    "styles/Canonical": ".sphinx/styles/Canonical",
+    "styles/config/vocabularies/Canonical": ".sphinx/styles/config/vocabularies/Canonical",
+}
+# single upstream files in the repo root -> local path
+ROOT_FILES = {"vale.ini": ".sphinx/vale.ini"}
 
-def main():
-    if os.path.exists(f"{DIR}/.sphinx/styles/Canonical"):
-        print("Vale directory exists")
-    else:
-        os.makedirs(f"{DIR}/.sphinx/styles/Canonical")
 
-    url = (
-        "https://api.github.com/repos/canonical/praecepta/"
-        + "contents/styles/Canonical"
-    )
-    r = requests.get(url)
-    for item in r.json():
-        download = requests.get(item["download_url"])
-        file = open(".sphinx/styles/Canonical/" + item["name"], "w")
-        file.write(download.text)
-        file.close()
+def blob_sha(path):
+    """The git blob SHA of the file at *path* (as in the contents API)."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
 
-    if os.path.exists(f"{DIR}/.sphinx/styles/config/vocabularies/Canonical"):
-        print("Vocab directory exists")
-    else:
-        os.makedirs(f"{DIR}/.sphinx/styles/config/vocabularies/Canonical")
 
-    url = (
-        "https://api.github.com/repos/canonical/praecepta/"
-        + "contents/styles/config/vocabularies/Canonical"
-    )
-    r = requests.get(url)
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".vale-")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+class StyleCache:
+    """Blobs by SHA plus the last file listing seen for each ref."""
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+
+    def blob_path(self, sha):
+        return os.path.join(self.root, "blobs", sha)
+
+    def listing(self, ref):
+        try:
+            with open(self.index_path, encoding="utf-8") as fh:
+                return json.load(fh).get(ref)
+        except (OSError, ValueError):
+            return None
+
+    def save_listing(self, ref, files):
+        try:
+            with open(self.index_path, encoding="utf-8") as fh:
+                index = json.load(fh)
+        except (OSError, ValueError):
+            index = {}
+        index[ref] = files
+        write_atomic(self.index_path, json.dumps(index, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def list_files(session, ref):
+    """``[{"path", "sha", "url"}]`` for every file to install, at *ref*."""
+    api = f"https://api.github.com/repos/{REPO}/contents"
+    files = []
+    for upstream, local in TARGETS.items():
+        r = session.get(f"{api}/{upstream}", params={"ref": ref}, timeout=TIMEOUT)
+        r.raise_for_status()
+        for item in r.json():
+            if item["type"] == "file":
+                files.append(
+                    {"path": f"{local}/{item['name']}", "sha": item["sha"], "url": item["download_url"]}
+                )
+    r = session.get(f"{api}/", params={"ref": ref}, timeout=TIMEOUT)
+    r.raise_for_status()
     for item in r.json():
-        download = requests.get(item["download_url"])
-        file = open(
-            ".sphinx/styles/config/vocabularies/Canonical/" + item["name"],
-            "w"
-        )
-        file.write(download.text)
-        file.close()
-    config = requests.get(
-        "https://raw.githubusercontent.com/canonical/praecepta/main/vale.ini"
+        if item["name"] in ROOT_FILES:
+            files.append({"path": ROOT_FILES[item["name"]], "sha": item["sha"], "url": item["download_url"]})
+    return files
+
+
+def fetch_blob(session, cache, entry):
+    """Make sure the blob of *entry* is in the cache; return whether it was downloaded."""
+    path = cache.blob_path(entry["sha"])
+    if os.path.exists(path):
+        return False
+    r = session.get(entry["url"], timeout=TIMEOUT)
+    r.raise_for_status()
+    data = r.content
+    actual = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+    if actual != entry["sha"]:
+        raise RuntimeError(f"{entry['url']}: expected blob {entry['sha']}, got {actual}")
+    write_atomic(path, data)
+    return True
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fetch the Canonical Vale configuration.")
+    p.add_argument("--ref", default="main", help="praecepta branch, tag or commit (default: main)")
+    p.add_argument(
+        "--cache-dir",
+        default=os.path.join(DIR, ".sphinx", ".vale_cache"),
+        help="Blob cache; commit it to vendor the styles (default: .sphinx/.vale_cache)",
     )
-    file = open(".sphinx/vale.ini", "w")
-    file.write(config.text)
-    file.close()
+    p.add_argument("--offline", action="store_true", help="Install from the cache only.")
+    p.add_argument("-j", "--jobs", type=int, default=8, help="Parallel downloads (default: 8)")
+    args = p.parse_args()
+
+    cache = StyleCache(args.cache_dir)
+    downloaded = 0
+    if args.offline:
+        files = cache.listing(args.ref)
+        if files is None:
+            sys.exit(f"No cached listing for ref '{args.ref}' in {args.cache_dir}")
+    else:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with requests.Session() as session:
+            session.mount("https://", HTTPAdapter(pool_maxsize=args.jobs))
+            token = os.environ.get("GITHUB_TOKEN")
+            if token:
+                session.headers["Authorization"] = f"token {token}"
+            files = list_files(session, args.ref)
+            with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+                downloaded = sum(pool.map(lambda e: fetch_blob(session, cache, e), files))
+        cache.save_listing(args.ref, files)
+
+    updated = 0
+    for entry in files:
+        dest = os.path.join(DIR, entry["path"])
+        if os.path.exists(dest) and blob_sha(dest) == entry["sha"]:
+            continue
+        blob = cache.blob_path(entry["sha"])
+        if not os.path.exists(blob):
+            sys.exit(f"{entry['path']} (blob {entry['sha']}) is not in the cache")
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(blob, dest)
+        updated += 1
+
+    print(f"Vale configuration at {args.ref}: {len(files)} files, {updated} updated, {downloaded} downloaded")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Link check of the built HTML with a persistent result cache.
+
+Links are collected from the pages under the build directory.  Internal links
+and their anchors are resolved against the built tree itself; external URLs
+are checked over one pooled session, a few requests per host at a time, and
+successful results are cached in ``.sphinx/.linkcheck_cache.json``.  A cached
+URL is only checked again once its domain's TTL has passed
+(``linkcheck_cache_ttl`` in ``conf.py``); failures are never cached.
+
+``linkcheck_ignore``, ``linkcheck_timeout`` and ``linkcheck_retries`` are
+read from ``conf.py`` without importing it.  Anchors are checked for internal
+links only.  ``--local`` checks internal links and anchors and never touches
+the network.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from html import unescape
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+from urllib.parse import unquote, urldefrag, urlsplit
+
+DEFAULT_TTL = 24 * 3600
+PER_HOST = 4
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:100.0) Gecko/20100101 Firefox/100.0 linkcheck-cache"
+
+_LINK_RE = re.compile(rb"""<(?:a|img)\s[^>]*?\b(?:href|src)\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.I)
+_ID_RE = re.compile(rb"""\b(?:id|name)\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.I)
+_SKIP_SCHEMES = {"mailto", "tel", "javascript", "data"}
+
+
+def read_conf(conf_path: Path) -> Dict[str, Any]:
+    """Literal ``linkcheck_*`` settings from *conf_path*, without executing it."""
+    settings: Dict[str, Any] = {}
+    tree = ast.parse(conf_path.read_text(encoding="utf-8"))
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id.startswith("linkcheck_"):
+                try:
+                    settings[target.id] = ast.literal_eval(node.value)
+                except ValueError:
+                    pass  # computed values cannot be read without importing conf.py
+    return settings
+
+###############################################################################
+# Built tree                                                                  #
+###############################################################################
+
+
+def _values(match: re.Match) -> str:
+    return unescape(next(g for g in match.groups() if g is not None).decode("utf-8", "replace"))
+
+
+class BuiltTree:
+    """Pages of a Sphinx build with their outgoing links and anchors."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.links: Dict[Path, List[str]] = {}
+        self._anchors: Dict[Path, Set[str]] = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d != "linkcheck")
+            for name in sorted(filenames):
+                if name.endswith(".html"):
+                    page = Path(dirpath) / name
+                    self.links[page] = [_values(m) for m in _LINK_RE.finditer(page.read_bytes())]
+
+    def anchors(self, page: Path) -> Set[str]:
+        if page not in self._anchors:
+            self._anchors[page] = {_values(m) for m in _ID_RE.finditer(page.read_bytes())}
+        return self._anchors[page]
+
+    def resolve(self, page: Path, href: str) -> Path | None:
+        """The file an internal *href* on *page* points at, or ``None`` if missing."""
+        path = unquote(urlsplit(href).path)
+        target = (page.parent / path).resolve() if path else page
+        if target.is_dir():
+            target = target / "index.html"
+        return target if target.is_file() else None
+
+    def check_internal(self, page: Path, href: str) -> str | None:
+        """Why *href* on *page* is broken, or ``None`` if it resolves."""
+        target = self.resolve(page, href)
+        if target is None:
+            return "target not found"
+        _, fragment = urldefrag(href)
+        if fragment and target.suffix == ".html" and unquote(fragment) not in self.anchors(target):
+            return f"anchor '{fragment}' not found"
+        return None
+
+###############################################################################
+# External URLs                                                               #
+###############################################################################
+
+
+class ResultCache:
+    """Successful check results per URL, with a time-to-live per domain."""
+
+    def __init__(self, path: Path, ttl: Dict[str, int], default_ttl: int) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.default_ttl = default_ttl
+        try:
+            self.entries: Dict[str, Dict] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def ttl_for(self, url: str) -> int:
+        host = urlsplit(url).hostname or ""
+        best = ("", self.default_ttl)
+        for domain, seconds in self.ttl.items():  # the longest matching domain wins
+            if (host == domain or host.endswith("." + domain)) and len(domain) > len(best[0]):
+                best = (domain, seconds)
+        return best[1]
+
+    def fresh(self, url: str, now: float) -> bool:
+        entry = self.entries.get(url)
+        return entry is not None and now - entry["checked"] < self.ttl_for(url)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self.entries, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class Checker:
+    """Check URLs over a pooled session, at most ``PER_HOST`` at a time per host."""
+
+    def __init__(self, timeout: float, tries: int, per_host: int = PER_HOST) -> None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._requests = requests
+        self.timeout = timeout
+        self.tries = max(1, tries)  # like linkcheck_retries: attempts in total
+        self.per_host = per_host
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=per_host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.Semaphore] = {}
+
+    def _slot(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.Semaphore(self.per_host)
+            return self._slots[host]
+
+    def check(self, url: str) -> Tuple[str, str]:
+        """``(status, detail)`` where status is ``working``, ``redirected`` or ``broken``."""
+        requests = self._requests
+        detail = ""
+        with self._slot(urlsplit(url).netloc):
+            for attempt in range(self.tries):
+                try:
+                    resp = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+                    if resp.status_code >= 400:  # some servers reject HEAD; retry with GET
+                        resp.close()
+                        resp = self.session.get(url, stream=True, allow_redirects=True, timeout=self.timeout)
+                    resp.close()
+                except requests.RequestException as exc:
+                    detail = str(exc)
+                else:
+                    if resp.status_code == 429 or resp.status_code >= 500:
+                        detail = f"{resp.status_code} {resp.reason}"
+                    elif resp.status_code >= 400:
+                        return "broken", f"{resp.status_code} {resp.reason}"
+                    elif resp.history:
+                        return "redirected", resp.url
+                    else:
+                        return "working", ""
+                if attempt + 1 < self.tries:
+                    time.sleep(2 ** attempt)
+        return "broken", detail
+
+###############################################################################
+# Main                                                                        #
+###############################################################################
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Link check of the built HTML with a result cache.")
+    p.add_argument("builddir", nargs="?", default="_build", help="Built HTML (default: _build)")
+    p.add_argument("--conf", default="conf.py", help="Sphinx configuration (default: conf.py)")
+    p.add_argument(
+        "--cache",
+        default=".sphinx/.linkcheck_cache.json",
+        help="Result cache (default: .sphinx/.linkcheck_cache.json)",
+    )
+    p.add_argument("--local", action="store_true", help="Check internal links and anchors only.")
+    p.add_argument("--refresh", action="store_true", help="Ignore cached results.")
+    p.add_argument("-j", "--jobs", type=int, default=16, help="Parallel checks (default: 16).")
+    p.add_argument("--json", metavar="PATH", help="Write the broken links to PATH as JSON.")
+    args = p.parse_args()
+
+    conf = read_conf(Path(args.conf)) if Path(args.conf).is_file() else {}
+    ignore = [re.compile(pat) for pat in conf.get("linkcheck_ignore", [])]
+    tree = BuiltTree(Path(args.builddir).resolve())
+
+    broken: List[Dict[str, str]] = []
+    external: Dict[str, List[Path]] = defaultdict(list)
+    internal = 0
+    for page, hrefs in tree.links.items():
+        for href in hrefs:
+            scheme = urlsplit(href).scheme
+            if scheme in _SKIP_SCHEMES or any(pat.match(href) for pat in ignore):
+                continue
+            if scheme in ("http", "https"):
+                external[urldefrag(href)[0]].append(page)
+                continue
+            internal += 1
+            reason = tree.check_internal(page, href)
+            if reason is not None:
+                broken.append({"page": str(page.relative_to(tree.root)), "uri": href, "info": reason})
+
+    checked = cached = 0
+    if not args.local:
+        cache = ResultCache(Path(args.cache), conf.get("linkcheck_cache_ttl", {}), DEFAULT_TTL)
+        now = time.time()
+        todo = sorted(url for url in external if args.refresh or not cache.fresh(url, now))
+        cached = len(external) - len(todo)
+        checker = Checker(float(conf.get("linkcheck_timeout", 30)), int(conf.get("linkcheck_retries", 1)))
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            for url, (status, info) in zip(todo, pool.map(checker.check, todo)):
+                checked += 1
+                if status == "broken":
+                    cache.entries.pop(url, None)
+                    for page in sorted(set(external[url])):
+                        broken.append({"page": str(page.relative_to(tree.root)), "uri": url, "info": info})
+                else:
+                    cache.entries[url] = {"status": status, "info": info, "checked": now}
+        cache.save()
+
+    for b in broken:
+        print(f"{b['page']}: [broken] {b['uri']}: {b['info']}")
+    print(
+        f"[linkcheck] {internal} internal links, {len(external)} external URLs "
+        f"({checked} checked, {cached} cached{', skipped' if args.local else ''}); {len(broken)} broken"
+    )
+    if args.json:
+        Path(args.json).write_text(json.dumps(broken, indent=1) + "\n", encoding="utf-8")
+    sys.exit(1 if broken else 0)
+
+
+if __name__ == "__main__":
+    main()
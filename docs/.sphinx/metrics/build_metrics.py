@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Link, image and page-weight counts of the built HTML pages.
+
+Each page is scanned once, through ``mmap``, on a pool of worker processes.
+Links are split into internal and external ones; a page's weight is its own
+size plus the local images it shows.  The summary is printed, and ``--json``
+writes it with a per-page breakdown, sorted so reports of two builds can be
+diffed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Set
+from urllib.parse import unquote, urlsplit
+
+SKIP_DIRS = {".sphinx", "venv", ".venv", "node_modules"}
+
+# "<a " and "<img " as counted by the old grep, with the rest of the tag
+_TAG_RE = re.compile(rb"<(a|img) ([^>]*)")
+_ATTR_RE = {
+    b"a": re.compile(rb"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I),
+    b"img": re.compile(rb"""\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I),
+}
+
+
+def find_pages(root: Path) -> List[Path]:
+    found: List[Path] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        found.extend(Path(dirpath) / f for f in sorted(filenames) if f.endswith(".html"))
+    return found
+
+
+def _attr(tag: bytes, attrs: bytes) -> str | None:
+    m = _ATTR_RE[tag].search(attrs)
+    if m is None:
+        return None
+    value = next(g for g in m.groups() if g is not None)
+    return value.decode("utf-8", errors="replace")
+
+
+def scan_page(path: Path) -> Dict[str, int]:
+    """Counts for one HTML page, read in a single pass."""
+    counts = {
+        "links": 0, "internal_links": 0, "external_links": 0, "images": 0,
+        "html_bytes": path.stat().st_size, "image_bytes": 0,
+    }
+    if not counts["html_bytes"]:
+        counts["weight"] = 0
+        return counts
+
+    images: Set[str] = set()
+    with path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for m in _TAG_RE.finditer(data):
+            tag, attrs = m.group(1), m.group(2)
+            target = _attr(tag, attrs)
+            if tag == b"a":
+                counts["links"] += 1
+                if target is not None:
+                    kind = "external_links" if urlsplit(target).scheme else "internal_links"
+                    counts[kind] += 1
+            else:
+                counts["images"] += 1
+                if target and not urlsplit(target).scheme:
+                    images.add(target)
+
+    for src in images:  # each image is downloaded once per page
+        local = (path.parent / unquote(urlsplit(src).path)).resolve()
+        if local.is_file():
+            counts["image_bytes"] += local.stat().st_size
+    counts["weight"] = counts["html_bytes"] + counts["image_bytes"]
+    return counts
+
+
+def measure(root: Path, jobs: int | None = None) -> Dict[str, Dict]:
+    pages = find_pages(root)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(scan_page, pages, chunksize=32))
+
+    per_page = {p.relative_to(root).as_posix(): r for p, r in zip(pages, results)}
+    keys = ("links", "internal_links", "external_links", "images", "html_bytes", "image_bytes", "weight")
+    summary = {"pages": len(pages)}
+    for k in keys:
+        summary[k] = sum(r[k] for r in results)
+    return {"summary": summary, "pages": dict(sorted(per_page.items()))}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Count links, images and page weight of built HTML.")
+    p.add_argument("root", nargs="?", default=".", help="Directory to scan (default: .)")
+    p.add_argument("-j", "--jobs", type=int, help="Worker processes (default: one per CPU).")
+    p.add_argument("--json", metavar="PATH", help="Write the report to PATH ('-' for stdout).")
+    args = p.parse_args()
+
+    report = measure(Path(args.root).resolve(), args.jobs)
+    if args.json:
+        text = json.dumps(report, indent=1, sort_keys=True)
+        if args.json == "-":
+            print(text)
+            return
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(text + "\n", encoding="utf-8")
+
+    s = report["summary"]
+    print("Summarising metrics for build files (.html)...")
+    print(f"\tpages: {s['pages']}")
+    print(f"\tlinks: {s['links']} ({s['internal_links']} internal, {s['external_links']} external)")
+    print(f"\timages: {s['images']}")
+    print(f"\tpage weight: {s['weight']} bytes")
+
+
+if __name__ == "__main__":
+    main()
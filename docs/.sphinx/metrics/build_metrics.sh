@@ -1,15 +1,6 @@
 #!/bin/bash
 # shellcheck disable=all
+# Kept for existing callers; the work is done by build_metrics.py.
+# usage: build_metrics.sh [root] [metrics dir (unused)]
 
-links=0
-images=0
-
-# count number of links
-links=$(find . -type d -path './.sphinx' -prune -o -name '*.html' -exec cat {} + | grep -o "<a " | wc -l)
-# count number of images
-images=$(find . -type d -path './.sphinx' -prune -o -name '*.html' -exec cat {} + | grep -o "<img " | wc -l)
-
-# summarise latest metrics
-echo "Summarising metrics for build files (.html)..."
-echo -e "\tlinks: $links"
-echo -e "\timages: $images"
+exec python3 "$(dirname "$0")/build_metrics.py" "${1:-.}"
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Word counts and readability of the documentation sources (.md, .rst).
+
+Every source file below the root is measured, including merged ``external/``
+trees; ``.sphinx``, ``_build``, virtualenvs and hidden directories are
+skipped.  ``vale ls-metrics`` runs once per file on a pool of workers and its
+results are cached by file content, so unchanged pages are not measured
+again.  Totals are summed over all files and printed; ``--json`` also writes
+them, with a per-file breakdown, as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+SUFFIXES = {".md", ".rst"}
+SKIP_DIRS = {".sphinx", "_build", "venv", ".venv", "node_modules", "__pycache__"}
+METRICS = ("words", "sentences", "syllables")
+READABLE_BELOW = 8  # Flesch-Kincaid grade level
+
+
+def find_sources(root: Path) -> List[Path]:
+    """All .md/.rst files below *root*, in a stable order."""
+    found: List[Path] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+        for name in sorted(filenames):
+            if Path(name).suffix in SUFFIXES:
+                found.append(Path(dirpath) / name)
+    return found
+
+
+def vale_version(vale: str) -> str:
+    out = subprocess.run([vale, "--version"], capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+
+def vale_metrics(vale: str, path: Path, config: str | None) -> Dict[str, int] | None:
+    """Words, sentences and syllables of *path* as counted by ``vale ls-metrics``."""
+    cmd = [vale] + ([f"--config={config}"] if config else []) + ["ls-metrics", str(path)]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        data = json.loads(out.stdout or "{}")
+    except (subprocess.CalledProcessError, ValueError) as exc:
+        print(f"Warning: vale ls-metrics failed for {path}: {exc}", file=sys.stderr)
+        return None
+    return {k: int(data.get(k, 0)) for k in METRICS}
+
+
+def grade(words: int, sentences: int, syllables: int) -> float | None:
+    """Flesch-Kincaid grade level, or ``None`` when there is no prose."""
+    if not words or not sentences:
+        return None
+    return 0.39 * (words / sentences) + 11.8 * (syllables / words) - 15.59
+
+
+class MetricsCache:
+    """Vale results keyed by file digest, invalidated when Vale changes."""
+
+    def __init__(self, path: Path | None, version: str) -> None:
+        self.path = path
+        self.version = version
+        self.entries: Dict[str, Dict[str, int]] = {}
+        if path is not None:
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            if data.get("vale") == version:
+                self.entries = data.get("files", {})
+
+    def save(self, used: set) -> None:
+        if self.path is None:
+            return
+        entries = {k: v for k, v in self.entries.items() if k in used}  # drop stale digests
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump({"vale": self.version, "files": entries}, fh)
+        os.replace(tmp, self.path)
+
+
+def measure(root: Path, vale: str, config: str | None, jobs: int, cache_path: Path | None) -> Dict:
+    files = find_sources(root)
+    cache = MetricsCache(cache_path, vale_version(vale))
+
+    digests: Dict[Path, str] = {}
+    raw_words: Dict[Path, int] = {}
+    for path in files:
+        data = path.read_bytes()
+        digests[path] = hashlib.sha256(data).hexdigest()
+        raw_words[path] = len(data.decode("utf-8", errors="replace").split())
+    # one vale run per distinct content; copies merged from several sources share it
+    todo = sorted({d: p for p, d in digests.items() if d not in cache.entries}.items())
+
+    missing = {k: 0 for k in METRICS}  # vale failed; counted as no prose
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        results = pool.map(lambda item: (item[0], vale_metrics(vale, item[1], config)), todo)
+        for digest, metrics in results:
+            if metrics is not None:
+                cache.entries[digest] = metrics
+    cache.save(set(digests.values()))
+
+    per_file = []
+    totals = {"files": len(files), "words_raw": 0, **{k: 0 for k in METRICS}}
+    for path in files:
+        metrics = cache.entries.get(digests[path], missing)
+        raw = raw_words[path]
+        per_file.append({"path": path.relative_to(root).as_posix(), "words_raw": raw, **metrics})
+        totals["words_raw"] += raw
+        for k in METRICS:
+            totals[k] += metrics[k]
+
+    level = grade(totals["words"], totals["sentences"], totals["syllables"])
+    summary = {
+        **totals,
+        "mean_words": totals["words"] // totals["files"] if totals["files"] else 0,
+        "readability": round(level, 2) if level is not None else None,
+        "readable": level is not None and int(level) < READABLE_BELOW,
+        "measured": len(todo),
+    }
+    return {"summary": summary, "files": per_file}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Sum Vale readability metrics over all doc sources.")
+    p.add_argument("root", nargs="?", default=".", help="Documentation root (default: .)")
+    p.add_argument("--vale", default="vale", help="Vale executable (default: vale from PATH).")
+    p.add_argument("--config", help="Vale configuration file.")
+    p.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Parallel vale processes."
+    )
+    p.add_argument(
+        "--cache",
+        default=".sphinx/.metrics_cache.json",
+        help="Cache file, relative to the root (default: .sphinx/.metrics_cache.json).",
+    )
+    p.add_argument("--no-cache", action="store_true", help="Measure every file again.")
+    p.add_argument("--json", metavar="PATH", help="Write the report to PATH ('-' for stdout).")
+    args = p.parse_args()
+
+    root = Path(args.root).resolve()
+    if shutil.which(args.vale) is None:
+        sys.exit(f"{args.vale} not found; run 'make vale-install' first")
+    if not find_sources(root):
+        print("There are no source files to calculate metrics")
+        return
+
+    report = measure(
+        root, args.vale, args.config, args.jobs, None if args.no_cache else root / args.cache
+    )
+    if args.json:
+        text = json.dumps(report, indent=1)
+        if args.json == "-":
+            print(text)
+            return
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(text + "\n", encoding="utf-8")
+
+    s = report["summary"]
+    print("Summarising metrics for source files (.md, .rst)...")
+    print(f"\ttotal files: {s['files']}")
+    print(f"\ttotal words (raw): {s['words_raw']}")
+    print(f"\ttotal words (prose): {s['words']}")
+    print(f"\taverage word count: {s['mean_words']}")
+    print(f"\treadability: {s['readability'] if s['readability'] is not None else 'n/a'}")
+    print(f"\treadable: {str(s['readable']).lower()}")
+    print(f"\tmeasured: {s['measured']} (others cached)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Sharded Sphinx build: one sphinx-build per merged category, in parallel.
+
+Every category that ``merge_docs`` wrote under ``external/<category>`` is
+built as its own project, and the rest of the tree (with a title-only stub
+per category index) as the main one.  All of them use the same ``conf.py``
+and are staged with symlinks so their pages keep the URLs of a single build;
+stitching is then copying each shard's ``external/<category>/`` pages over
+the main output and merging the search indices.
+
+References between shards go through intersphinx, using the ``objects.inv``
+each shard wrote last time (see ``SPHINX_SHARD_INVENTORIES`` in
+``conf.py``); when a shard has none yet, an extra first pass writes them.
+With ``-W`` only the last pass turns warnings into errors, and ``-w``
+collects the warnings of every shard into one file, as ``make html`` does.
+Sidebars of shard pages show the shard's own tree.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+SHARDS_DIR = ".shards"  # below the build directory; <name>/{src,doctrees,html}
+STATE_FILE = ".merge_docs_state.json"
+
+
+def find_categories(external: Path) -> List[str]:
+    """Categories of the last merge, from the state file ``merge_docs`` keeps."""
+    try:
+        state = json.loads((external / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    categories = {e["category"] for e in state.get("sources", []) if e.get("category")}
+    return sorted(c for c in categories if (external / c).is_dir())
+
+
+def _link(target: Path, link: Path) -> None:
+    link.parent.mkdir(parents=True, exist_ok=True)
+    link.symlink_to(target.resolve(), target_is_directory=target.is_dir())
+
+
+def stage(source: Path, external: Path, builddir: Path, shards: List[str]) -> Dict[str, Path]:
+    """Symlinked source trees for the main project and every shard.
+
+    Only the ``src`` trees are made afresh; doctrees and output are kept, so
+    the shards build incrementally.
+    """
+    staging = builddir / SHARDS_DIR
+    for tree in staging.glob("*/src"):
+        shutil.rmtree(tree)
+    ext_rel = external.relative_to(source)
+    trees: Dict[str, Path] = {}
+
+    main = staging / "main" / "src"
+    for entry in source.iterdir():
+        if entry.resolve() not in (external, builddir):
+            _link(entry, main / entry.name)
+    for entry in external.iterdir():
+        if entry.name not in shards:
+            _link(entry, main / ext_rel / entry.name)
+    for cat in shards:  # the real index is built by the shard
+        stub = main / ext_rel / cat / "index.md"
+        stub.parent.mkdir(parents=True)
+        stub.write_text(f"# {cat}\n", encoding="utf-8")
+    trees["main"] = main
+
+    for cat in shards:
+        tree = staging / f"shard-{cat}" / "src"
+        _link(external / cat, tree / ext_rel / cat)
+        for entry in external.iterdir():  # reuse/ and snippets shared through includes
+            if entry.name not in shards:
+                _link(entry, tree / ext_rel / entry.name)
+        trees[cat] = tree
+    return trees
+
+
+def shard_excludes(external: Path, ext_rel: Path, shards: List[str]) -> List[str]:
+    """``exclude_patterns`` that keep a shard to its category's documents.
+
+    The rest of ``external/`` is staged only for includes to resolve.
+    """
+    return [
+        f"{(ext_rel / e.name).as_posix()}{'/**' if e.is_dir() else ''}"
+        for e in sorted(external.iterdir())
+        if e.name not in shards
+    ]
+
+
+def build(
+    name: str,
+    tree: Path,
+    args: argparse.Namespace,
+    inventories: Dict[str, str],
+    root_doc: str | None = None,
+    excludes: List[str] | None = None,
+    strict: bool = False,
+) -> Tuple[str, int, float]:
+    """Run sphinx-build for one staged tree; ``(name, exit status, seconds)``.
+
+    Warnings go to ``warnings.txt`` next to the tree; *strict* adds
+    ``-W --keep-going``.
+    """
+    out = tree.parent / "html"
+    cmd = [
+        args.sphinx_build, "-b", args.builder, "-c", str(Path(args.source).resolve()),
+        "-d", str(tree.parent / "doctrees"), "-j", str(args.sphinx_jobs), "-q",
+        "-w", str(tree.parent / "warnings.txt"),
+        str(tree), str(out), *shlex.split(args.sphinx_opts),
+    ]
+    if strict:
+        cmd[1:1] = ["-W", "--keep-going"]
+    if root_doc is not None:
+        cmd += ["-D", f"root_doc={root_doc}"]
+    if excludes:
+        cmd += ["-D", f"exclude_patterns={','.join(excludes)}"]
+    env = dict(os.environ)
+    others = {k: v for k, v in inventories.items() if k != name}
+    if others:
+        env["SPHINX_SHARD_INVENTORIES"] = json.dumps(others, sort_keys=True)
+    start = time.perf_counter()
+    status = subprocess.run(cmd, env=env).returncode
+    return name, status, time.perf_counter() - start
+
+
+def collect_warnings(trees: Dict[str, Path], source: Path, warning_file: Path) -> None:
+    """Write the warnings of every shard to *warning_file*, with source paths."""
+    with warning_file.open("w", encoding="utf-8") as fh:
+        for tree in trees.values():
+            log = tree.parent / "warnings.txt"
+            if log.is_file():
+                fh.write(log.read_text(encoding="utf-8").replace(str(tree), str(source)))
+
+###############################################################################
+# Stitching                                                                   #
+###############################################################################
+
+
+def _copy_over(src: Path, dst: Path) -> None:
+    shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
+
+def _docs(ids, remap: Dict[int, int]) -> List[int]:
+    return [remap[i] for i in (ids if isinstance(ids, list) else [ids]) if i in remap]
+
+
+def merge_search_indices(indices: List[Tuple[Dict, Set[str]]]) -> Dict:
+    """One search index from several, leaving out each index's *dropped* documents.
+
+    Document and object type numbers are renumbered; a document that more
+    than one index has is taken from the first one that does not drop it.
+    """
+    merged: Dict = {
+        "docnames": [], "filenames": [], "titles": [], "terms": {}, "titleterms": {},
+        "objects": {}, "objnames": {}, "objtypes": {}, "alltitles": {}, "indexentries": {},
+        "envversion": indices[0][0].get("envversion", {}),
+    }
+    seen: Set[str] = set()
+    for index, dropped in indices:
+        remap: Dict[int, int] = {}
+        for i, doc in enumerate(index["docnames"]):
+            if doc in dropped or doc in seen:
+                continue
+            seen.add(doc)
+            remap[i] = len(merged["docnames"])
+            for key in ("docnames", "filenames", "titles"):
+                merged[key].append(index[key][i])
+
+        for key in ("terms", "titleterms"):
+            for term, ids in index.get(key, {}).items():
+                merged[key].setdefault(term, []).extend(_docs(ids, remap))
+
+        types: Dict[int, int] = {}
+        known = {name: idx for idx, name in merged["objtypes"].items()}
+        for old, name in index.get("objtypes", {}).items():
+            if name not in known:
+                known[name] = len(merged["objtypes"])
+                merged["objtypes"][known[name]] = name
+                merged["objnames"][known[name]] = index["objnames"][old]
+            types[int(old)] = known[name]
+        for prefix, entries in index.get("objects", {}).items():
+            if isinstance(entries, dict):  # Sphinx < 7: {name: [doc, type, prio, anchor]}
+                out = merged["objects"].setdefault(prefix, {})
+                for obj, (doc, typ, *rest) in entries.items():
+                    if doc in remap:
+                        out[obj] = [remap[doc], types[typ], *rest]
+            else:  # [[doc, type, prio, anchor, name]]
+                out = merged["objects"].setdefault(prefix, [])
+                out.extend([remap[e[0]], types[e[1]], *e[2:]] for e in entries if e[0] in remap)
+
+        for key in ("alltitles", "indexentries"):
+            for title, refs in index.get(key, {}).items():
+                kept = [[remap[r[0]], *r[1:]] for r in refs if r[0] in remap]
+                if kept:
+                    merged[key].setdefault(title, []).extend(kept)
+
+    for key in ("terms", "titleterms"):
+        merged[key] = {
+            term: ids[0] if len(ids) == 1 else ids
+            for term, ids in ((t, sorted(set(i))) for t, i in merged[key].items())
+            if ids
+        }
+    return merged
+
+
+def stitch(builddir: Path, outputs: Dict[str, Path], shards: List[str], ext_rel: Path) -> None:
+    """Copy the main output to *builddir* and lay every shard's pages over it."""
+    from sphinx.search import js_index
+
+    _copy_over(outputs["main"], builddir)
+    indices: List[Tuple[Dict, Set[str]]] = []
+    main_index = outputs["main"] / "searchindex.js"
+    stubs = {(ext_rel / cat / "index").as_posix() for cat in shards}
+    if main_index.is_file():
+        indices.append((js_index.loads(main_index.read_text(encoding="utf-8")), stubs))
+
+    for cat in shards:
+        out = outputs[cat]
+        pages = out / ext_rel / cat
+        if pages.is_dir():
+            _copy_over(pages, builddir / ext_rel / cat)
+        for shared in ("_images", "_downloads", f"_sources/{(ext_rel / cat).as_posix()}"):
+            if (out / shared).is_dir():
+                _copy_over(out / shared, builddir / shared)
+        shard_index = out / "searchindex.js"
+        if shard_index.is_file():
+            indices.append((js_index.loads(shard_index.read_text(encoding="utf-8")), set()))
+
+    if indices:
+        merged = merge_search_indices(indices)
+        (builddir / "searchindex.js").write_text(js_index.dumps(merged), encoding="utf-8")
+
+###############################################################################
+# Main                                                                        #
+###############################################################################
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Build merged categories as parallel Sphinx shards.")
+    p.add_argument("source", nargs="?", default=".", help="Sphinx source directory (default: .)")
+    p.add_argument("builddir", nargs="?", default="_build", help="Output directory (default: _build)")
+    p.add_argument("--external", default="external", help="merge_docs output, relative to the source.")
+    p.add_argument("-b", "--builder", default="dirhtml", help="Sphinx builder (default: dirhtml).")
+    p.add_argument("--sphinx-build", default="sphinx-build", help="sphinx-build executable.")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Shards built at once.")
+    p.add_argument("--sphinx-jobs", default="1", help="-j passed to each sphinx-build (default: 1).")
+    p.add_argument("--passes", type=int, default=1, help="Build passes; 2 resolves new cross-shard refs.")
+    p.add_argument("--sphinx-opts", default="", help="Further sphinx-build options, as one string.")
+    p.add_argument("-W", dest="strict", action="store_true", help="Fail on warnings in the last pass.")
+    p.add_argument("-w", "--warning-file", help="Write the warnings of all shards to this file.")
+    args = p.parse_args()
+
+    source = Path(args.source).resolve()
+    external = source / args.external
+    builddir = Path(args.builddir).resolve()
+    shards = find_categories(external)
+    if not shards:
+        sys.exit(f"No merged categories under {external}; run 'make pull' or use 'make html'.")
+
+    trees = stage(source, external, builddir, shards)
+    ext_rel = external.relative_to(source)
+    excludes = shard_excludes(external, ext_rel, shards)
+    passes = max(1, args.passes)
+    if passes == 1 and not all((t.parent / "html" / "objects.inv").is_file() for t in trees.values()):
+        print("[shard] No inventories from an earlier build; building twice to resolve references")
+        passes = 2
+    for n in range(passes):
+        last = n == passes - 1
+        inventories = {
+            name: str(tree.parent / "html" / "objects.inv")
+            for name, tree in trees.items()
+            if (tree.parent / "html" / "objects.inv").is_file()
+        }
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            jobs = [pool.submit(build, "main", trees["main"], args, inventories, strict=args.strict and last)]
+            jobs += [
+                pool.submit(
+                    build, cat, trees[cat], args, inventories,
+                    (ext_rel / cat / "index").as_posix(), excludes, args.strict and last,
+                )
+                for cat in shards
+            ]
+            results = [job.result() for job in jobs]
+        for name, status, seconds in sorted(results, key=lambda r: -r[2]):
+            print(f"[shard] {name}: {'ok' if status == 0 else f'failed ({status})'} in {seconds:.1f}s")
+        if last and args.warning_file:
+            collect_warnings(trees, source, Path(args.warning_file))
+        if any(status for _, status, _ in results):
+            sys.exit(1)
+
+    stitch(builddir, {name: tree.parent / "html" for name, tree in trees.items()}, shards, ext_rel)
+    print(f"[shard] {len(shards)} shards stitched into {builddir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Benchmarks ``merge_docs()`` against local stand-ins for GitHub and Discourse.
+
+Synthetic git repos are generated under a scratch directory (file count,
+include depth and ``docs/reuse`` fragments are configurable) and a local HTTP
+server answers Discourse-style ``/raw/{id}`` requests, with ETags so warm runs
+revalidate.  For every manifest size the merge is run cold (empty cache) and
+warm (same cache, ``--incremental``), and throughput, per-stage times and peak
+memory are reported.  Every run is a process of its own, so its peak RSS is
+not an earlier run's; allocations are traced in a separate, untimed run on a
+copy of the same output and cache.
+
+Example::
+
+    python bench_merge_docs.py --sources 10,100,1000 --json bench.json
+    python bench_merge_docs.py --compare bench.json   # exit 1 on a regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import yaml
+from git import Repo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from merge_docs import merge_docs  # noqa: E402
+
+###############################################################################
+# Synthetic sources                                                           #
+###############################################################################
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def make_repo(
+    path: Path, subdirs: List[str], files: int, include_depth: int, reuse_lines: int
+) -> None:
+    """Create a git repo at *path* with one doc tree per entry of *subdirs*.
+
+    Each tree holds ``index.md``, *files* pages and a chain of
+    *include_depth* nested includes under ``docs/shared``; ``docs/reuse``
+    gets *reuse_lines* link targets and substitutions.
+    """
+    repo = Repo.init(str(path), initial_branch="main")
+    with repo.config_writer() as cw:
+        cw.set_value("user", "name", "bench")
+        cw.set_value("user", "email", "bench@example.invalid")
+        cw.set_value("uploadpack", "allowFilter", "true")  # for --sparse
+
+    for depth in range(include_depth):
+        nxt = f".. include:: inc{depth + 1}.rst\n" if depth + 1 < include_depth else ""
+        _write(path / "docs" / "shared" / f"inc{depth}.rst", f"Level {depth}\n\n{nxt}")
+    include = ".. include:: ../shared/inc0.rst\n" if include_depth else ""
+
+    for sub in subdirs:
+        tree = path / "docs" / sub
+        _write(tree / "index.md", f"# {sub}\n\n" + "".join(f"- page{i}\n" for i in range(files)))
+        for i in range(files):
+            _write(tree / f"page{i}.rst", f"Page {i}\n{'=' * 8}\n\n{include}\n" + "Text. " * 200)
+
+    if reuse_lines:
+        label = path.name
+        _write(
+            path / "docs" / "reuse" / "links.txt",
+            "".join(f".. _{label}-link{i}: https://example.invalid/{label}/{i}\n" for i in range(reuse_lines)),
+        )
+        _write(
+            path / "docs" / "reuse" / "substitutions.txt",
+            "".join(f".. |{label}-s{i}| replace:: value {i}\n" for i in range(reuse_lines)),
+        )
+
+    repo.git.add("-A")
+    repo.git.commit("-q", "-m", "synthetic docs")
+
+
+def make_manifest(
+    root: Path,
+    sources: int,
+    repos: int,
+    discourse_every: int,
+    discourse_url: str,
+    files: int,
+    include_depth: int,
+    reuse_lines: int,
+) -> Path:
+    """Generate repos for *sources* manifest entries and return the manifest path.
+
+    Every *discourse_every*-th entry is a Discourse source; the GitHub entries
+    are spread over *repos* repositories, one ``doc_subdir`` each.
+    """
+    github = [i for i in range(sources) if not discourse_every or (i + 1) % discourse_every]
+    per_repo: Dict[int, List[int]] = {}
+    for n, i in enumerate(github):
+        per_repo.setdefault(n % max(1, repos), []).append(i)
+
+    entries: List[Dict] = []
+    for r, members in sorted(per_repo.items()):
+        repo_path = root / "repos" / f"repo{r}"
+        make_repo(repo_path, [f"s{i}" for i in members], files, include_depth, reuse_lines)
+        for i in members:
+            entries.append(
+                {
+                    "name": f"Source {i}",
+                    "type": "github",
+                    "repo_url": repo_path.as_uri(),
+                    "branch": "main",
+                    "doc_subdir": f"docs/s{i}",
+                    "category": f"cat{i % 10}",
+                    "dest_dir": f"s{i}",
+                }
+            )
+    github_set = set(github)
+    for i in range(sources):
+        if i not in github_set:
+            entries.append(
+                {
+                    "name": f"Source {i}",
+                    "type": "discourse",
+                    "discourse_url": discourse_url,
+                    "category": f"cat{i % 10}",
+                    "dest_dir": f"s{i}",
+                    "pages": [
+                        {"title": f"Topic {i}.{t}", "topic_id": i * 10 + t, "filename": f"t{t}.md"}
+                        for t in range(3)
+                    ],
+                }
+            )
+    entries.sort(key=lambda e: int(e["name"].split()[1]))  # interleave as in a real manifest
+
+    manifest = root / f"manifest-{sources}.yaml"
+    manifest.write_text(yaml.safe_dump({"sources": entries}, sort_keys=False), encoding="utf-8")
+    return manifest
+
+###############################################################################
+# Discourse stand-in                                                          #
+###############################################################################
+
+
+class _RawHandler(BaseHTTPRequestHandler):
+    body_kb = 16
+
+    def _body(self) -> bytes | None:
+        topic = self.path.rsplit("/", 1)[-1]
+        if not self.path.startswith("/raw/") or not topic.isdigit():
+            return None
+        text = f"Body of topic {topic}.\n\n" + "Lorem ipsum dolor sit amet. " * (self.body_kb * 36)
+        comments = "A reply that merge_docs should never read.\n" * 2000
+        return f"{text}\n\n-------------------------\n\n{comments}".encode("utf-8")
+
+    def _send(self, with_body: bool) -> None:
+        body = self._body()
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if with_body:
+            with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+                self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._send(True)
+
+    def do_HEAD(self) -> None:
+        self._send(False)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@contextlib.contextmanager
+def discourse_server(body_kb: int) -> Iterator[str]:
+    """Serve ``/raw/{id}`` on a free local port and yield its base URL."""
+    handler = type("RawHandler", (_RawHandler,), {"body_kb": body_kb})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+###############################################################################
+# Runs                                                                        #
+###############################################################################
+
+
+def _max_rss_kib() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+
+
+def measure(spec: Dict) -> Dict:
+    """One ``merge_docs()`` run described by *spec*, measured from inside this process."""
+    if spec["trace"]:
+        tracemalloc.start()
+    quiet = contextlib.nullcontext() if spec["verbose"] else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with quiet:
+        timings = merge_docs(
+            Path(spec["manifest"]), Path(spec["out"]), cache_dir=Path(spec["cache"]), **spec["opts"]
+        )
+    wall = time.perf_counter() - start
+    result = {"wall_seconds": wall, "max_rss_kib": _max_rss_kib(), "timings": timings.to_json()}
+    if spec["trace"]:
+        result["peak_python_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+
+def _run_child(spec: Dict) -> Dict:
+    """:func:`measure` in a fresh interpreter (see ``--run-case``)."""
+    result_path = Path(spec["out"]).parent / f".bench-result-{Path(spec['out']).name}.json"
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--run-case", json.dumps(spec), str(result_path)]
+    subprocess.run(cmd, check=True)
+    try:
+        return json.loads(result_path.read_text(encoding="utf-8"))
+    finally:
+        result_path.unlink()
+
+
+def run_case(manifest: Path, out: Path, cache: Path, label: str, verbose: bool, **opts) -> Dict:
+    """Run ``merge_docs()`` once in a fresh process and return its measurements.
+
+    The timed run does not trace allocations: the Python peak is taken from
+    an earlier run of the same merge on copies of *out* and *cache*.
+    """
+    spec = {"manifest": str(manifest), "verbose": verbose, "opts": opts}
+    scratch = Path(tempfile.mkdtemp(dir=out.parent, prefix=".trace-"))
+    try:
+        for tree in (out, cache):
+            if tree.exists():
+                shutil.copytree(tree, scratch / tree.name, symlinks=True)
+        traced = _run_child(
+            {**spec, "out": str(scratch / out.name), "cache": str(scratch / cache.name),
+             "verbose": False, "trace": True}
+        )
+    finally:
+        shutil.rmtree(scratch)
+    timed = _run_child({**spec, "out": str(out), "cache": str(cache), "trace": False})
+
+    wall = timed["wall_seconds"]
+    totals = timed["timings"]["totals"]
+    files = sum(int(t["files"]) for t in totals.values())
+    sources = len(yaml.safe_load(manifest.read_text(encoding="utf-8"))["sources"])
+    return {
+        "case": label,
+        "sources": sources,
+        "wall_seconds": wall,
+        "sources_per_second": sources / wall if wall else 0.0,
+        "files_per_second": files / wall if wall else 0.0,
+        "files": files,
+        "peak_python_kib": traced["peak_python_kib"],
+        "max_rss_kib": timed["max_rss_kib"],
+        "stages": {stage: round(t["seconds"], 4) for stage, t in totals.items()},
+    }
+
+
+def _print_results(results: List[Dict]) -> None:
+    header = f"{'case':<16} {'sources':>7} {'wall s':>8} {'src/s':>8} {'files/s':>9} {'py peak':>9} {'max rss':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['case']:<16} {r['sources']:>7} {r['wall_seconds']:>8.2f} "
+            f"{r['sources_per_second']:>8.1f} {r['files_per_second']:>9.0f} "
+            f"{r['peak_python_kib'] / 1024:>7.1f}Mi {r['max_rss_kib'] / 1024:>7.1f}Mi"
+        )
+    print()
+    stages = sorted({s for r in results for s in r["stages"]})
+    print(f"{'case':<16} " + " ".join(f"{s:>9}" for s in stages))
+    for r in results:
+        print(f"{r['case']:<16} " + " ".join(f"{r['stages'].get(s, 0.0):>9.2f}" for s in stages))
+
+
+def _compare(results: List[Dict], baseline_path: Path, tolerance: float) -> List[str]:
+    """Cases that got more than *tolerance* slower than in *baseline_path*."""
+    baseline = {r["case"]: r for r in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]}
+    slower: List[str] = []
+    for r in results:
+        base = baseline.get(r["case"])
+        if base is None:
+            continue
+        ratio = r["wall_seconds"] / base["wall_seconds"] if base["wall_seconds"] else 1.0
+        if ratio > 1.0 + tolerance:
+            slower.append(f"{r['case']}: {base['wall_seconds']:.2f}s -> {r['wall_seconds']:.2f}s ({ratio:.2f}x)")
+    return slower
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Benchmark merge_docs against local stand-ins.")
+    p.add_argument(
+        "--sources",
+        default="10,100,1000",
+        help="Comma-separated manifest sizes to run (default: 10,100,1000).",
+    )
+    p.add_argument(
+        "--repos",
+        type=int,
+        default=0,
+        help="Distinct git repos the GitHub sources are spread over (default: sources/10).",
+    )
+    p.add_argument("--files", type=int, default=20, help="Pages per doc_subdir (default: 20).")
+    p.add_argument("--include-depth", type=int, default=5, help="Length of the include chain (default: 5).")
+    p.add_argument("--reuse-lines", type=int, default=50, help="Lines per docs/reuse file (default: 50).")
+    p.add_argument(
+        "--discourse-every",
+        type=int,
+        default=5,
+        metavar="N",
+        help="Make every Nth source a Discourse source; 0 for none (default: 5).",
+    )
+    p.add_argument("--topic-kb", type=int, default=16, help="Size of each topic body in KiB (default: 16).")
+    p.add_argument("-j", "--jobs", type=int, default=8, help="--jobs passed to merge_docs (default: 8).")
+    p.add_argument("--sparse", action="store_true", help="Run merge_docs with --sparse.")
+    p.add_argument("--workdir", help="Keep generated repos and output here instead of a temp dir.")
+    p.add_argument("--verbose", action="store_true", help="Show merge_docs output.")
+    p.add_argument("--json", metavar="PATH", help="Write the results to PATH.")
+    p.add_argument("--compare", metavar="PATH", help="Fail if slower than the results in PATH.")
+    p.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown against --compare, as a fraction (default: 0.25).",
+    )
+    p.add_argument("--run-case", nargs=2, metavar=("SPEC", "RESULT"), help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.run_case:  # child process of run_case()
+        spec, result_path = args.run_case
+        Path(result_path).write_text(json.dumps(measure(json.loads(spec))), encoding="utf-8")
+        return
+
+    sizes = [int(n) for n in args.sources.split(",") if n.strip()]
+    results: List[Dict] = []
+    with contextlib.ExitStack() as stack:
+        root = Path(args.workdir) if args.workdir else Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        root.mkdir(parents=True, exist_ok=True)
+        url = stack.enter_context(discourse_server(args.topic_kb))
+        for n in sizes:
+            case_dir = root / f"n{n}"
+            t0 = time.perf_counter()
+            manifest = make_manifest(
+                case_dir, n, args.repos or max(1, n // 10), args.discourse_every, url,
+                args.files, args.include_depth, args.reuse_lines,
+            )
+            print(f"[bench] Generated {n} sources in {time.perf_counter() - t0:.1f}s")
+            for phase, incremental in (("cold", False), ("warm", True)):
+                result = run_case(
+                    manifest,
+                    case_dir / "out",
+                    case_dir / "cache",
+                    f"{n}-{phase}",
+                    args.verbose,
+                    jobs=args.jobs,
+                    sparse=args.sparse,
+                    incremental=incremental,
+                )
+                print(f"[bench] {result['case']}: {result['wall_seconds']:.2f}s")
+                results.append(result)
+
+    print()
+    _print_results(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": results}, indent=1), encoding="utf-8")
+    if args.compare:
+        slower = _compare(results, Path(args.compare), args.tolerance)
+        for line in slower:
+            print(f"[bench] Regression: {line}")
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 import datetime
 import ast
+import json
+import os
+import re
 
 # Configuration for the Sphinx documentation builder.
 # All configuration specific to your project should be done in this file.
@@ -204,6 +207,13 @@ linkcheck_anchors_ignore_for_url = [r"https://github\.com/.*"]
 # linkcheck_timeout = 30
 linkcheck_retries = 3
 
+# Seconds a successful result stays valid in 'make linkcheck-cached', per
+# domain (subdomains included); other domains use one day
+linkcheck_cache_ttl = {
+    "github.com": 604800,  # a week
+    "ubuntu.com": 259200,  # three days
+}
+
 ########################
 # Configuration extras #
 ########################
@@ -247,6 +257,39 @@ exclude_patterns = [
     "doc-cheat-sheet*",
 ]
 
+# Inventories of the other shards, set by .sphinx/sharded_build.py so that
+# references between separately built categories still resolve; every shard
+# lands in the same output root, but Sphinx wants a distinct URI per entry,
+# hence ./, ././, ...
+
+if os.environ.get("SPHINX_SHARD_INVENTORIES"):
+    extensions.append("sphinx.ext.intersphinx")
+    intersphinx_mapping = {
+        name: ("./" * n, inventory)
+        for n, (name, inventory) in enumerate(
+            sorted(json.loads(os.environ["SPHINX_SHARD_INVENTORIES"]).items()), start=1
+        )
+    }
+
+    def _shard_reference(app, env, node, contnode):
+        # Intersphinx makes relative URIs relative to the document's directory,
+        # one level short of the page's URL for dirhtml; go up from the page
+        from sphinx.ext.intersphinx import missing_reference
+
+        refdoc = node.get("refdoc")
+        node["refdoc"] = None
+        try:
+            newnode = missing_reference(app, env, node, contnode)
+        finally:
+            node["refdoc"] = refdoc
+        if newnode is not None and refdoc and "://" not in newnode["refuri"]:
+            up = "../" * app.builder.get_target_uri(refdoc).count("/")
+            newnode["refuri"] = up + re.sub(r"^(\./)+", "", newnode["refuri"])
+        return newnode
+
+    def setup(app):
+        app.connect("missing-reference", _shard_reference, priority=400)
+
 # Adds custom CSS files, located under 'html_static_path'
 
 html_css_files = [
@@ -262,8 +305,8 @@ html_css_files = [
 # Specifies a reST snippet to be appended to each .rst file
 
 rst_epilog = """
-.. include:: /reuse/links.txt
-.. include:: /reuse/substitutions.txt
+.. include:: /external/reuse/links.txt
+.. include:: /external/reuse/substitutions.txt
 """
 
 # Feedback button at the top; enabled by default
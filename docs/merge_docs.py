@@ -7,12 +7,74 @@ of .md/.rst files, including a root index that groups sources by optional
 New features (May 2025)
 =======================
 1. Recursive include support: Whenever a file cloned from a GitHub repo
-   contains an `.. include::` or `.. literalinclude::` directive,
-   the referenced file (recursively) is copied into the local documentation
-   tree so that the directive resolves when the docs are built locally.
+   contains an `.. include::` or `.. literalinclude::` directive (or a MyST
+   ```{include}``/```{literalinclude}`` fence), the referenced file
+   (recursively) is copied into the local documentation tree so that the
+   directive resolves when the docs are built locally.
 2. `reuse/` aggregation: For every GitHub repo that contains `docs/reuse/`
      with `links.txt` and/or `substitutions.txt`,
-     the corresponding files from all repos are joined under ``reuse/``.
+     the corresponding files from all repos are joined under ``reuse/``
+     in the output directory, each repo read once per commit and each link
+     target or substitution written once.
+3. Shared checkouts: Sources that point at the same ``repo_url`` and
+   ``branch`` are served from a single clone per run.
+4. Mirror cache: Repos are kept as bare mirrors under ``~/.cache/merge_docs``
+   (``--cache-dir``/``--no-cache``/``--cache-size``) and only the configured
+   branch is fetched on later runs.
+5. Sparse mode (``--sparse``): Mirrors are blobless partial clones and only
+   ``doc_subdir``, ``docs/reuse`` and include targets are checked out.
+6. Parallel fetching (``--jobs N``): Clones and Discourse topics are fetched
+   on a thread pool; merging itself stays serial and in manifest order.
+7. Discourse client: Topics are fetched over one pooled session with
+   per-host concurrency limits, timeouts and backoff on 429/5xx responses.
+   Bodies are streamed to disk and the transfer stops at the comment cutoff.
+8. HTTP cache: Discourse responses are cached with their ETag/Last-Modified
+   validators and revalidated with conditional requests; ``--offline``
+   builds entirely from the mirror and HTTP caches.
+9. Incremental output (``--incremental``): Unchanged files keep their mtime,
+   and files that no source produces any more are pruned.
+10. Lockfile: Resolved commits and Discourse body digests are written to
+    ``<manifest>.lock``, as are digests of what ``local`` sources read and
+    of archives; ``--check`` compares them with upstream using ``git
+    ls-remote``, HEAD requests and local hashing, without fetching anything
+    (except archive URLs without validators).  It exits 0 when up to date,
+    1 when a pull is needed and 2 when upstream could not be reached.
+11. Timings: Wall time, bytes transferred and files written are recorded per
+    source and stage; ``--timings`` prints them as a table, ``--timings-json``
+    saves them and ``--profile`` dumps cProfile statistics of the run.
+12. Copy modes (``--copy-mode``): Files are reflinked (FICLONE) or hardlinked
+    out of the checkouts where the filesystem allows it, and only copied
+    otherwise.  Checkouts live under the cache directory so they share a
+    filesystem with the output more often.
+13. Dedup (``--dedup``): Every output file is a hardlink to a read-only,
+    content-addressed blob under ``<output>/.merge_docs_blobs``, so images
+    and include targets that several sources pull are stored once.  A
+    report of the space saved is printed after the run.
+14. Lazy mode (``--lazy``): The root and category indices are written first,
+    with placeholder pages for sources that have no content yet, so
+    ``sphinx-autobuild`` can start at once; the sources are then filled in
+    the background and swapped in file by file.
+15. Watch mode (``--watch``): Upstream is polled every ``--interval``
+    seconds with ``git ls-remote`` and conditional Discourse requests, and
+    only the sources that changed are merged again, along with the indices.
+16. Source types are looked up in a registry (:func:`register_source_type`)
+    that plugins can extend through the ``merge_docs.sources`` entry-point
+    group.  GitPython, requests and PyYAML are imported only when a run
+    needs them, so ``--help`` and ``--check`` start quickly.
+17. Local and archive sources: ``type: local`` merges a directory already
+    on disk (``path``, relative to the manifest) in place, and
+    ``type: archive`` streams a tarball or zip (``archive``, a path or URL)
+    and extracts only ``doc_subdir``, ``docs/reuse`` and any ``extract``
+    paths (after dropping ``strip_components`` leading directories, e.g. 1
+    for GitHub archives).  Both select pages, collect reuse fragments and
+    follow includes like GitHub sources, without git.  Files of ``local``
+    sources are never hardlinked into the output, so editing the output
+    cannot change them.
+18. Manifest validation and plan: The manifest is checked before anything
+    is fetched (unknown or misspelt keys, wrong types, duplicate names,
+    sources writing to the same files).  ``--validate`` stops there,
+    ``--dry-run`` prints what would be cloned, fetched and written, and
+    ``--plan PATH`` saves that plan as JSON.
 
 The rest of the behaviour is unchanged.
 """
@@ -20,218 +82,1656 @@ The rest of the behaviour is unchanged.
 from __future__ import annotations
 
 import argparse
+import codecs
+import contextlib
+import cProfile
+import difflib
+import errno
+import fcntl
+import hashlib
+import json
 import os
 import re
 import shutil
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 from collections import defaultdict
-from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Set, Tuple
 
-import requests
-import yaml
-from git import Repo
+if TYPE_CHECKING:  # imported where used, so only runs that need them pay for them
+    import requests
 
 ###############################################################################
 # Helpers                                                                     #
 ###############################################################################
 
-# Global accumulator for reuse fragments
-_REUSE_CACHE: Dict[str, List[Tuple[str, List[str]]]] = {"links": [], "substitutions": []}
-
-_INCLUDE_RE = re.compile(r"^\s*\.\.\s+(?:literal)?include::\s+(.+?)\s*$")
+# reST ``.. include::`` / ``.. literalinclude::`` and MyST ```{include}`` /
+# ``:::{literalinclude}`` fences; group 1 is set for literal includes.
+_INCLUDE_RE = re.compile(
+    r"^\s*(?:\.\.\s+(literal)?include::|(?:`{3,}|:{3,})\{(literal)?include\})\s+(.+?)\s*$"
+)
+_INCLUDING_SUFFIXES = {".rst", ".md", ".txt", ".inc"}
+
+# Persistent cache for repo mirrors; see MirrorCache
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "merge_docs"
+DEFAULT_CACHE_SIZE_MB = 2048
+
+# Discourse/HTTP defaults; see HttpClient
+DEFAULT_HTTP_TIMEOUT = 30.0
+DEFAULT_HTTP_RETRIES = 5
+CHECK_TIMEOUT = 5.0  # seconds --check gives each ls-remote or HEAD request; no retries
+DEFAULT_PER_HOST = 4
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# How OutputWriter places copied files; see --copy-mode
+COPY_MODES = ("auto", "reflink", "hardlink", "copy")
+_FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+# errnos meaning "this filesystem (pair) cannot do it", as opposed to real I/O errors
+_NO_LINK_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL, errno.ENOTTY,
+    errno.EOPNOTSUPP, errno.ENOSYS, errno.EBADF,
+}
 
 ###############################################################################
 # Low-level file helpers                                                      #
 ###############################################################################
 
-def copy_tree(src: str | Path, dest: str | Path) -> None:
-    """Recursively copy *src* to *dest* (existing files are overwritten)."""
-    src = Path(src)
-    dest = Path(dest)
+def _file_digest(path: Path) -> str:
+    """SHA-256 hex digest of the file at *path*."""
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BlobStore:
+    """Content-addressed, read-only copies of the files in the output tree.
+
+    Blobs are named by their SHA-256 and live inside the output directory, so
+    output files can always be hardlinks to them.  :meth:`collect` removes
+    blobs that no output file links to any more.
+    """
 
-    if not dest.exists():
-        shutil.copytree(src, dest)
-        return
+    DIRNAME = ".merge_docs_blobs"
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.refs: Dict[str, Set[str]] = defaultdict(set)  # digest -> output paths
+        self.sizes: Dict[str, int] = {}
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def note(self, digest: str, rel: str, size: int) -> None:
+        self.refs[digest].add(rel)
+        self.sizes[digest] = size
+
+    def report(self, top: int = 5) -> List[str]:
+        """Human-readable summary of how much the store deduplicated."""
+        files = sum(len(paths) for paths in self.refs.values())
+        logical = sum(self.sizes[d] * len(paths) for d, paths in self.refs.items())
+        unique = sum(self.sizes.values())
+        lines = [
+            f"{files} files in {len(self.refs)} blobs; "
+            f"{_human_size(logical)} of content stored in {_human_size(unique)} "
+            f"({_human_size(logical - unique)} saved)"
+        ]
+        shared = sorted(
+            (d for d, paths in self.refs.items() if len(paths) > 1),
+            key=lambda d: (-self.sizes[d] * (len(self.refs[d]) - 1), d),
+        )
+        for d in shared[:top]:
+            paths = sorted(self.refs[d])
+            lines.append(f"  {len(paths)}x {_human_size(self.sizes[d])}: {', '.join(paths)}")
+        return lines
+
+    def collect(self) -> int:
+        """Delete blobs without any output file linked to them; return how many."""
+        removed = 0
+        for blob in self.root.glob("??/*"):
+            with contextlib.suppress(OSError):
+                if blob.stat().st_nlink == 1:
+                    blob.unlink()
+                    removed += 1
+        for sub in self.root.glob("??"):
+            with contextlib.suppress(OSError):
+                sub.rmdir()
+        return removed
+
+
+class OutputWriter:
+    """Write the merged tree and remember which files each run produced.
+
+    In *incremental* mode files whose content is unchanged are left alone, so
+    their mtimes stay put and Sphinx only re-reads pages that really changed;
+    changed files are replaced atomically.  Either way the list of written
+    files is saved in ``STATE_FILE`` and :meth:`prune` removes files that an
+    earlier run wrote but no source produces any more.
+    """
 
-    for root, dirs, files in os.walk(src):
-        rel_root = Path(root).relative_to(src)
-        dest_root = dest / rel_root
-        dest_root.mkdir(parents=True, exist_ok=True)
+    STATE_FILE = ".merge_docs_state.json"
+
+    def __init__(
+        self,
+        output_dir: Path,
+        incremental: bool = False,
+        timings: RunTimings | None = None,
+        copy_mode: str = "copy",
+        dedup: bool = False,
+    ) -> None:
+        if copy_mode not in COPY_MODES:
+            raise ValueError(f"unknown copy mode {copy_mode!r}")
+        self.output_dir = output_dir
+        self.incremental = incremental
+        self.timings = timings or RunTimings()
+        self.copy_mode = copy_mode
+        self.blobs = BlobStore(output_dir / BlobStore.DIRNAME) if dedup else None
+        self.written: Set[str] = set()
+        self.unchanged = 0
+        self.placed: Dict[str, int] = defaultdict(int)  # files per method actually used
+        self._copied_from: Dict[Path, Path] = {}
+        self.by_source: Dict[str, Set[str]] = defaultdict(set)  # source name -> files
+        self.read_by: Dict[str, Set[Path]] = defaultdict(set)  # source name -> files copied
+        self._owner: str | None = None
+        self._in_place = False  # reading a tree this run does not own
+        self._dirs: Dict[Path, int] = {}  # directories made so far -> st_dev
+        self._unsupported: Set[Tuple[str, int, int]] = set()  # (method, src dev, dst dev)
+
+    def _mkdir(self, directory: Path) -> int:
+        """Create *directory* once per run instead of once per file; return its device."""
+        if directory not in self._dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._dirs[directory] = directory.stat().st_dev
+        return self._dirs[directory]
+
+    def _methods(self, hardlink: bool = True) -> Tuple[str, ...]:
+        if self.copy_mode == "auto":
+            methods: Tuple[str, ...] = ("reflink", "hardlink", "copy")
+        else:
+            methods = (self.copy_mode, "copy") if self.copy_mode != "copy" else ("copy",)
+        return methods if hardlink else tuple(m for m in methods if m != "hardlink")
+
+    def _place(self, src_file: Path, dst_file: Path, hardlink: bool = True) -> None:
+        """Put the content of *src_file* at *dst_file* with the cheapest method.
+
+        Reflinks and hardlinks are made under a temporary name and renamed over
+        *dst_file*.  A method that fails for a pair of devices is not tried
+        again for that pair during this run.  With *hardlink* false the result
+        is always a file of its own, never another name for *src_file*.
+        """
+        methods = self._methods(hardlink)
+        if len(methods) > 1:
+            src_dev = src_file.stat().st_dev
+            with contextlib.suppress(OSError):
+                dst_stat = dst_file.stat()
+                if hardlink and (dst_stat.st_dev, dst_stat.st_ino) == (src_dev, src_file.stat().st_ino):
+                    self.placed["hardlink"] += 1
+                    return  # already a link to the same file
+            dst_dev = self._mkdir(dst_file.parent)
+            for method in methods[:-1]:
+                key = (method, src_dev, dst_dev)
+                if key in self._unsupported:
+                    continue
+                try:
+                    self._link(method, src_file, dst_file)
+                except OSError as exc:
+                    if exc.errno not in _NO_LINK_ERRNOS:
+                        raise
+                    self._unsupported.add(key)
+                    if self.copy_mode != "auto":
+                        print(f"[out] Warning: {method} not supported for {dst_file.parent} ({exc.strerror}); copying")
+                    continue
+                self.placed[method] += 1
+                return
+
+        # Never write into an existing file: it may be a link shared with others.
+        fd, tmp = tempfile.mkstemp(dir=dst_file.parent, prefix=f".{dst_file.name}.")
+        os.close(fd)
+        try:
+            shutil.copy2(src_file, tmp)
+            os.chmod(tmp, os.stat(tmp).st_mode | 0o200)  # blobs are read-only
+            os.replace(tmp, dst_file)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+        self.placed["copy"] += 1
+
+    @staticmethod
+    def _link(method: str, src_file: Path, dst_file: Path) -> None:
+        fd, tmp = tempfile.mkstemp(dir=dst_file.parent, prefix=f".{dst_file.name}.")
+        try:
+            if method == "reflink":
+                with open(src_file, "rb") as src_fh:
+                    fcntl.ioctl(fd, _FICLONE, src_fh.fileno())
+                os.close(fd)
+                fd = -1
+                shutil.copystat(src_file, tmp)
+            else:
+                os.close(fd)
+                fd = -1
+                os.unlink(tmp)
+                os.link(src_file, tmp)
+            os.replace(tmp, dst_file)
+        except BaseException:
+            if fd != -1:
+                os.close(fd)
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+    def _record(self, path: Path, nbytes: int = 0) -> str | None:
+        """Note that *path* was written; return it relative to the output tree."""
+        self.timings.account(nbytes, files=1)
+        try:
+            rel = path.resolve().relative_to(self.output_dir.resolve())
+        except ValueError:
+            return None  # outside the output tree; never pruned
+        self.written.add(rel.as_posix())
+        if self._owner is not None:
+            self.by_source[self._owner].add(rel.as_posix())
+        return rel.as_posix()
+
+    @contextlib.contextmanager
+    def owned_by(self, source: str) -> Iterator[None]:
+        """Attribute the files written in this block to *source*."""
+        self._owner = source
+        try:
+            yield
+        finally:
+            self._owner = None
+
+    @contextlib.contextmanager
+    def reading_in_place(self) -> Iterator[None]:
+        """Never hardlink output files to the files read in this block.
+
+        For trees the run does not own, such as ``local`` sources: a link
+        would let edits to the output (or to the blob store) reach them.
+        """
+        self._in_place = True
+        try:
+            yield
+        finally:
+            self._in_place = False
+
+    def keep(self, files: Iterable[str]) -> None:
+        """Treat *files* (relative paths) as written, so :meth:`prune` keeps them."""
+        self.written.update(files)
+
+    def _link_blob(self, blob: Path, digest: str, dst_file: Path, rel: str) -> None:
+        """Make *dst_file* a hardlink to *blob*.
+
+        The blob's mtime is bumped whenever a path starts pointing at it, so
+        Sphinx notices the change even if the blob is older than its last build.
+        """
+        size = blob.stat().st_size
+        self.blobs.note(digest, rel, size)  # type: ignore[union-attr]
+        with contextlib.suppress(OSError):
+            if os.path.samefile(blob, dst_file):
+                self.unchanged += 1
+                return
+        self._mkdir(dst_file.parent)
+        try:
+            self._link("hardlink", blob, dst_file)
+        except OSError as exc:
+            if exc.errno not in _NO_LINK_ERRNOS:
+                raise
+            self._place(blob, dst_file)
+            return
+        os.utime(blob)
+        self.placed["blob"] += 1
+
+    def _blob_from_file(self, src_file: Path) -> Tuple[Path, str]:
+        """The blob with the content of *src_file*, stored first if needed.
+
+        Blobs are always files of their own (copies or reflinks), since they
+        are made read-only and their mtimes are bumped.
+        """
+        digest = _file_digest(src_file)
+        blob = self.blobs.path(digest)  # type: ignore[union-attr]
+        if not blob.is_file():
+            self._mkdir(blob.parent)
+            self._place(src_file, blob, hardlink=False)
+            os.chmod(blob, 0o444)
+        return blob, digest
+
+    def wrote(self, path: Path) -> bool:
+        """Whether this run wrote *path*."""
+        try:
+            rel = path.resolve().relative_to(self.output_dir.resolve())
+        except ValueError:
+            return False
+        return rel.as_posix() in self.written
+
+    def wrote_from(self, dst_file: Path, src_file: Path) -> bool:
+        """Whether this run already copied *src_file* to *dst_file*."""
+        return self._copied_from.get(dst_file.resolve()) == src_file.resolve()
+
+    def copy_file(self, src_file: str | Path, dst_file: str | Path) -> None:
+        src_file, dst_file = Path(src_file), Path(dst_file)
+        rel = self._record(dst_file, src_file.stat().st_size)
+        self._copied_from[dst_file.resolve()] = src_file.resolve()
+        if self._owner is not None:
+            self.read_by[self._owner].add(src_file.resolve())
+        if self.blobs is not None and rel is not None:
+            self._link_blob(*self._blob_from_file(src_file), dst_file, rel)
+            return
+        if (
+            self.incremental
+            and dst_file.is_file()
+            and dst_file.stat().st_size == src_file.stat().st_size
+            and not (self._in_place and os.path.samefile(dst_file, src_file))
+            and _file_digest(dst_file) == _file_digest(src_file)
+        ):
+            self.unchanged += 1
+            return
+        self._mkdir(dst_file.parent)
+        self._place(src_file, dst_file, hardlink=not self._in_place)
+
+    def copy_tree(self, src: str | Path, dest: str | Path) -> None:
+        src, dest = Path(src), Path(dest)
+        for root, _, files in os.walk(src):
+            dest_root = dest / Path(root).relative_to(src)
+            self._mkdir(dest_root)
+            for f in files:
+                self.copy_file(Path(root) / f, dest_root / f)
+
+    def write_text(self, path: str | Path, text: str) -> None:
+        path = Path(path)
+        if self.blobs is not None:
+            self.write_chunks(path, [text])
+            return
+        data = text.encode("utf-8")
+        self._record(path, len(data))
+        if self.incremental:
+            try:
+                if path.read_bytes() == data:
+                    self.unchanged += 1
+                    return
+            except OSError:
+                pass
+        _write_atomic(path, text)
+
+    def write_chunks(self, path: str | Path, chunks: Iterable[str]) -> None:
+        """Stream *chunks* into *path* without holding the whole text in memory."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+            rel = self._record(path, os.path.getsize(tmp))
+            if self.blobs is not None and rel is not None:
+                digest = _file_digest(Path(tmp))
+                blob = self.blobs.path(digest)
+                if blob.is_file():
+                    os.unlink(tmp)
+                else:
+                    self._mkdir(blob.parent)
+                    os.chmod(tmp, 0o444)
+                    os.replace(tmp, blob)
+                self._link_blob(blob, digest, path, rel)
+                return
+            if self.incremental and path.is_file() and _file_digest(path) == _file_digest(Path(tmp)):
+                self.unchanged += 1
+                os.unlink(tmp)
+                return
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+    def previous_state(self) -> Dict:
+        """The state saved by the last run (``files`` and ``sources``), if any."""
+        try:
+            state = json.loads((self.output_dir / self.STATE_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def prune(self, sources: List[Dict] | None = None) -> None:
+        """Delete files left over from earlier runs and save this run's state.
+
+        *sources* are the index entries of this run; they are saved with the
+        list of files so that later runs can build indices without merging.
+        """
+        state_path = self.output_dir / self.STATE_FILE
+        previous = set(self.previous_state().get("files", []))
+
+        for rel in sorted(previous - self.written):
+            stale = self.output_dir / rel
+            if stale.is_file():
+                print(f"[prune] Removing {stale}")
+                stale.unlink()
+                for parent in stale.parents:
+                    if parent == self.output_dir or not parent.is_relative_to(self.output_dir):
+                        break
+                    with contextlib.suppress(OSError):
+                        parent.rmdir()  # only succeeds once the directory is empty
+
+        state: Dict[str, object] = {"files": sorted(self.written)}
+        if sources is not None:
+            state["sources"] = sources
+        _write_atomic(state_path, json.dumps(state, indent=1))
+        if self.incremental:
+            print(f"[out] {len(self.written)} files, {self.unchanged} unchanged")
+        if self.copy_mode != "copy" and self.placed:
+            print("[out] Placed " + ", ".join(f"{n} by {m}" for m, n in sorted(self.placed.items())))
+        if self.blobs is not None:
+            for line in self.blobs.report():
+                print(f"[dedup] {line}")
+            removed = self.blobs.collect()
+            if removed:
+                print(f"[dedup] Removed {removed} unreferenced blobs")
+        elif (self.output_dir / BlobStore.DIRNAME).is_dir():
+            print("[dedup] Removing the blob store of an earlier --dedup run")
+            shutil.rmtree(self.output_dir / BlobStore.DIRNAME)
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    """Write *text* to *path* through a temporary file and an atomic rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def _dir_size(path: Path) -> int:
+    """Total size in bytes of all files below *path*."""
+    total = 0
+    for root, _, files in os.walk(path):
         for f in files:
-            shutil.copy2(Path(root) / f, dest_root / f)
+            with contextlib.suppress(OSError):
+                total += (Path(root) / f).stat().st_size
+    return total
+
+
+def _human_size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    raise AssertionError("unreachable")
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on *lock_path* (shared by concurrent runs)."""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+###############################################################################
+# Timings                                                                     #
+###############################################################################
 
 
-def copy_file(src_file: str | Path, dst_file: str | Path) -> None:
-    """Copy a single file, ensuring parent directories exist."""
-    dst_file = Path(dst_file)
-    dst_file.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(src_file, dst_file)
+class RunTimings:
+    """Wall time, bytes and files per (source, stage) of one merge run.
+
+    Work is attributed with ``with timings.stage(name, "clone"): ...``; code
+    running inside a stage reports what it moved through :meth:`account`
+    without knowing which source it works for.  The active stage is tracked
+    per thread, so prefetch workers are attributed correctly.  Stage times of
+    concurrent workers overlap and may add up to more than the wall time.
+    """
+
+    STAGES = ("clone", "copy", "includes", "reuse", "discourse", "index")
+    RUN = "(run)"  # pseudo source for work shared by all sources
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self._rows: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._order: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def declare(self, sources: Iterable[str]) -> None:
+        """Report *sources* in this order (the manifest order)."""
+        for name in sources:
+            self._order.setdefault(name, len(self._order))
+
+    @contextlib.contextmanager
+    def stage(self, source: str, stage: str) -> Iterator[None]:
+        with self._lock:
+            self._order.setdefault(source, len(self._order))
+            row = self._rows.setdefault((source, stage), {"seconds": 0.0, "bytes": 0, "files": 0})
+        outer = getattr(self._local, "row", None)
+        self._local.row = row
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.row = outer
+            with self._lock:
+                row["seconds"] += elapsed
+            if outer is not None:  # nested stages are not counted twice
+                with self._lock:
+                    outer["seconds"] -= elapsed
+
+    def account(self, nbytes: int = 0, files: int = 0) -> None:
+        """Add *nbytes* and *files* to the stage active in this thread, if any."""
+        row = getattr(self._local, "row", None)
+        if row is None:
+            return
+        with self._lock:
+            row["bytes"] += nbytes
+            row["files"] += files
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    def rows(self) -> List[Dict[str, object]]:
+        """One dict per (source, stage), in manifest and pipeline order."""
+        def order(key: Tuple[str, str]) -> Tuple[int, int]:
+            source, stage = key
+            rank = self.STAGES.index(stage) if stage in self.STAGES else len(self.STAGES)
+            return self._order.get(source, len(self._order)), rank
+
+        with self._lock:
+            return [
+                {"source": source, "stage": stage, **row}
+                for (source, stage), row in sorted(self._rows.items(), key=lambda kv: order(kv[0]))
+            ]
+
+    def to_json(self) -> Dict[str, object]:
+        rows = self.rows()
+        totals: Dict[str, Dict[str, float]] = {}
+        for row in rows:
+            total = totals.setdefault(str(row["stage"]), {"seconds": 0.0, "bytes": 0, "files": 0})
+            for k in total:
+                total[k] += row[k]  # type: ignore[operator]
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return {"wall_seconds": end - self.started, "stages": rows, "totals": totals}
+
+    def table(self) -> str:
+        """The timings as a plain-text table.
+
+        Sources are in manifest order and their stages in pipeline order; the
+        totals per stage follow.
+        """
+        data = self.to_json()
+        width = max([len("source")] + [len(str(r["source"])) for r in data["stages"]])  # type: ignore[union-attr]
+        lines = [f"{'source':<{width}}  {'stage':<9}  {'seconds':>8}  {'files':>6}  {'bytes':>10}"]
+
+        def line(source: str, stage: str, row: Dict) -> str:
+            return (
+                f"{source:<{width}}  {stage:<9}  {row['seconds']:>8.2f}  "
+                f"{int(row['files']):>6}  {_human_size(row['bytes']):>10}"
+            )
+
+        for row in data["stages"]:  # type: ignore[union-attr]
+            lines.append(line(row["source"], row["stage"], row))
+        lines.append("-" * len(lines[0]))
+        for stage, total in data["totals"].items():  # type: ignore[union-attr]
+            lines.append(line("total", stage, total))
+        lines.append(f"wall time: {data['wall_seconds']:.2f}s")
+        return "\n".join(lines)
 
 ###############################################################################
 # include:: handling                                                          #
 ###############################################################################
 
-def _scan_includes(file_path: Path) -> List[str]:
-    """Return a list of *relative* paths referenced by ``.. include::`` in *file_path*."""
-    if file_path.suffix.lower() not in {".rst", ".md"}:
+def _scan_includes(file_path: Path) -> List[Tuple[str, bool]]:
+    """Return ``(relative path, is_literal)`` for every include in *file_path*."""
+    if file_path.suffix.lower() not in _INCLUDING_SUFFIXES:
         return []
 
-    includes: List[str] = []
+    includes: List[Tuple[str, bool]] = []
     try:
         with file_path.open("r", encoding="utf-8", errors="ignore") as fh:
             for line in fh:
                 m = _INCLUDE_RE.match(line)
                 if m:
-                    includes.append(m.group(1).strip())
+                    includes.append((m.group(3).strip(), bool(m.group(1) or m.group(2))))
     except FileNotFoundError:
         pass  # ignore broken include for now
     return includes
 
 
-def _copy_includes_recursive(
-    source_root: Path,
-    dest_root: Path,
-    including_file: Path,
-    seen: Set[Path],
-) -> None:
-    """Recursively copy all include targets needed by *including_file*.
+class IncludeGraph:
+    """Include edges between the files of one checkout.
 
-    *source_root* is the repo folder; *dest_root* is the local copy location.
-    *including_file* must already have been copied to *dest_root*.
+    Every file is scanned at most once and its edges are memoised, so sources
+    that share a checkout share the work.  :meth:`copy_closure` walks the edges
+    with an explicit stack, which keeps deep include chains off the Python
+    call stack.
     """
-    for rel_inc in _scan_includes(including_file):
-        repo_inc_path = (source_root / including_file.relative_to(dest_root).parent / rel_inc).resolve()
-        local_inc_path = dest_root / including_file.relative_to(dest_root).parent / rel_inc
-
-        repo_inc_path = repo_inc_path.resolve()
-        local_inc_path = local_inc_path.resolve()
 
-        if repo_inc_path in seen:
-            continue
-        if not repo_inc_path.exists():
-            print(f"[include] Warning: {rel_inc} referenced from {including_file} not found in repo.")
-            continue
+    def __init__(self, root: Path, checkout: Checkout | None = None) -> None:
+        self.root = root.resolve()
+        self._checkout = checkout
+        self._edges: Dict[Path, List[Tuple[str, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def edges(self, repo_file: Path) -> List[Tuple[str, bool]]:
+        with self._lock:
+            if repo_file not in self._edges:
+                self._edges[repo_file] = _scan_includes(repo_file)
+            return self._edges[repo_file]
+
+    def _resolve(self, repo_file: Path, rel_inc: str) -> Path | None:
+        """Find the repo file that *rel_inc* in *repo_file* points at, if any."""
+        target = (repo_file.parent / rel_inc).resolve()
+        if not target.is_relative_to(self.root):
+            return None
+        if not target.exists() and self._checkout is not None:
+            self._checkout.ensure_file(target)
+        return target if target.is_file() else None
+
+    def copy_closure(self, starts: List[Tuple[Path, Path]], writer: OutputWriter) -> None:
+        """Copy every file transitively included by *starts*.
+
+        *starts* pairs a repo file with the place it was copied to; include
+        targets are written next to the copy at the same relative path, so the
+        directives resolve in the merged tree.  Targets that this run already
+        wrote from the same repo file are not copied again.
+        """
+        stack = list(reversed(starts))
+        seen: Set[Path] = {repo_file.resolve() for repo_file, _ in starts}
+        while stack:
+            repo_file, dest_file = stack.pop()
+            for rel_inc, literal in reversed(self.edges(repo_file)):
+                if rel_inc.startswith("/"):
+                    continue  # relative to the Sphinx source dir, not the repo
+                target = self._resolve(repo_file, rel_inc)
+                if target is None:
+                    print(f"[include] Warning: {rel_inc} referenced from {dest_file} not found in repo.")
+                    continue
+                if target in seen:
+                    continue
+                seen.add(target)
+                dest_target = dest_file.parent / rel_inc
+                if not writer.wrote_from(dest_target, target):
+                    writer.copy_file(target, dest_target)
+                if not literal:
+                    stack.append((target, dest_target))
 
-        seen.add(repo_inc_path)
-        copy_file(repo_inc_path, local_inc_path)
-        _copy_includes_recursive(source_root, dest_root, local_inc_path, seen)
 
 ###############################################################################
 # reuse/ aggregation                                                          #
 ###############################################################################
 
-def _collect_reuse_fragments(repo_label: str, repo_root: Path) -> None:
-    """Read links.txt / substitutions.txt under *repo_root*/docs/reuse/ and cache them."""
-    reuse_dir = repo_root / "docs" / "reuse"
-    if not reuse_dir.is_dir():
-        return
+# ``.. _name: url`` link targets and ``.. |name| directive::`` substitutions
+_REUSE_NAME_RE = {
+    "links": re.compile(r"\.\.\s+_(`[^`]+`|[^:`]+):"),
+    "substitutions": re.compile(r"\.\.\s+\|([^|]+)\|"),
+}
+_REUSE_WHAT = {"links": "link target", "substitutions": "substitution"}
+
 
-    for kind in ("links", "substitutions"):
-        txt = reuse_dir / f"{kind}.txt"
-        if txt.is_file():
-            with txt.open("r", encoding="utf-8", errors="ignore") as fh:
-                lines = [ln.rstrip("\n") for ln in fh if ln.strip()]  # keep non-blank lines
-            if lines:
-                _REUSE_CACHE[kind].append((repo_label, lines))
+def _reuse_definitions(lines: List[str]) -> Iterator[List[str]]:
+    """Split *lines* into definitions: an unindented line plus its indented options."""
+    block: List[str] = []
+    for line in lines:
+        if block and line[:1] in (" ", "\t"):
+            block.append(line)
+            continue
+        if block:
+            yield block
+        block = [line]
+    if block:
+        yield block
 
 
-def _write_reuse(output_dir: Path) -> None:
-    dest_reuse = output_dir / "reuse"
-    if not any(_REUSE_CACHE.values()):
-        return  # nothing to write
+class ReuseAggregator:
+    """``docs/reuse/`` fragments of all GitHub repos, joined under ``reuse/``.
 
-    dest_reuse.mkdir(parents=True, exist_ok=True)
+    Each repo is read once per commit, however many sources use it.  A link
+    target or substitution defined by several repos is written once; when two
+    repos define it differently, the first definition is kept and the other
+    is reported.  Safe to use from several threads.
+    """
+
+    KINDS = ("links", "substitutions")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._seen: Set[Tuple[str, str]] = set()  # (repo_url, commit)
+        self._blocks: Dict[str, List[Tuple[str, List[List[str]]]]] = {k: [] for k in self.KINDS}
+        self._defined: Dict[Tuple[str, str], Tuple[str, str]] = {}  # (kind, name) -> (label, body)
+        self.by_source: Dict[str, Dict] = {}  # source name -> what it read, for the state file
+        self.duplicates = 0
+        self.conflicts = 0
+
+    def collect(self, source: str, label: str, repo_url: str, commit: str, repo_root: Path) -> None:
+        """Read links.txt / substitutions.txt under *repo_root*/docs/reuse/."""
+        with self._lock:
+            if (repo_url, commit) in self._seen:
+                return
+        fragments: Dict[str, List[str]] = {}
+        for kind in self.KINDS:
+            txt = repo_root / "docs" / "reuse" / f"{kind}.txt"
+            if txt.is_file():
+                with txt.open("r", encoding="utf-8", errors="ignore") as fh:
+                    lines = [ln.rstrip("\n") for ln in fh if ln.strip()]  # keep non-blank lines
+                if lines:
+                    fragments[kind] = lines
+        record = {"repo_url": repo_url, "commit": commit, "label": label, "fragments": fragments}
+        if self.restore(record):
+            self.by_source[source] = record
+
+    def restore(self, record: Dict) -> bool:
+        """Add fragments read by an earlier :meth:`collect`; ``False`` if already known."""
+        with self._lock:
+            key = (record["repo_url"], record["commit"])
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            for kind, lines in record["fragments"].items():
+                self._add(kind, record["label"], lines)
+            return True
+
+    def _add(self, kind: str, label: str, lines: List[str]) -> None:
+        kept: List[List[str]] = []
+        for block in _reuse_definitions(lines):
+            m = _REUSE_NAME_RE[kind].match(block[0])
+            if m is None:  # comments and anything else are kept as they are
+                kept.append(block)
+                continue
+            name = " ".join(m.group(1).strip("`").split())
+            if kind == "links":
+                name = name.lower()  # reference names are case-insensitive
+            body = " ".join(" ".join([block[0][m.end():], *block[1:]]).split())
+            first = self._defined.get((kind, name))
+            if first is None:
+                self._defined[(kind, name)] = (label, body)
+                kept.append(block)
+            elif first[1] == body:
+                self.duplicates += 1
+            else:
+                self.conflicts += 1
+                print(
+                    f"[warn] reuse: {label} defines {_REUSE_WHAT[kind]} '{name}' "
+                    f"differently from {first[0]}; keeping the definition of {first[0]}"
+                )
+        if kept:
+            self._blocks[kind].append((label, kept))
+
+    def _chunks(self, kind: str) -> Iterator[str]:
+        for label, blocks in self._blocks[kind]:
+            yield f".. {label}:\n"
+            for block in blocks:
+                yield "\n".join(block) + "\n"
+            yield "\n"  # blank line separator
+
+    def write(self, dest_dir: Path, writer: OutputWriter) -> None:
+        """Stream ``links.txt`` and ``substitutions.txt`` into *dest_dir*.
+
+        Both files are always written, so the includes in ``rst_epilog``
+        resolve even when no repo has reuse fragments.
+        """
+        for kind in self.KINDS:
+            writer.write_chunks(dest_dir / f"{kind}.txt", self._chunks(kind))
+        if self.duplicates or self.conflicts:
+            print(f"[reuse] Dropped {self.duplicates} duplicate and {self.conflicts} conflicting definitions")
 
-    for kind in ("links", "substitutions"):
-        if not _REUSE_CACHE[kind]:
-            continue
-        out_file = dest_reuse / f"{kind}.txt"
-        with out_file.open("w", encoding="utf-8") as fh:
-            for label, lines in _REUSE_CACHE[kind]:
-                fh.write(f".. {label}:\n")
-                fh.write("\n".join(lines))
-                fh.write("\n\n")  # blank line separator
 
 ###############################################################################
 # GitHub-specific processing                                                  #
 ###############################################################################
 
-def _clone_repo_shallow(repo_url: str, branch: str, clone_to: Path) -> None:
-    print(f"[git] Cloning {repo_url}@{branch} → {clone_to} (depth 1)")
-    Repo.clone_from(repo_url, to_path=str(clone_to), branch=branch, multi_options=["--depth=1"])
+def _fetch_branch(
+    mirror: Path, repo_url: str, branch: str, blobless: bool = False, offline: bool = False
+) -> str:
+    """Fetch the tip of *branch* into the bare *mirror* and return its commit SHA.
+
+    With *blobless* the mirror becomes a partial clone: only commits and trees
+    are transferred and file contents are fetched when a checkout needs them.
+    With *offline* the mirror is used as it is.
+    """
+    from git import Repo
+
+    if offline:
+        if not (mirror / "HEAD").is_file():
+            raise RuntimeError(f"{repo_url} is not in the mirror cache (offline mode)")
+        print(f"[git] Using cached {repo_url}@{branch} (offline)")
+        return Repo(str(mirror)).git.rev_parse(f"refs/heads/{branch}")
+
+    if not (mirror / "HEAD").is_file():
+        repo = Repo.init(str(mirror), bare=True, mkdir=True)
+        repo.git.remote("add", "origin", repo_url)
+    else:
+        repo = Repo(str(mirror))
+
+    fetch_opts: Dict[str, object] = {"depth": 1, "no_tags": True}
+    if blobless:
+        with repo.config_writer() as cw:
+            cw.set_value('remote "origin"', "promisor", "true")
+            cw.set_value('remote "origin"', "partialclonefilter", "blob:none")
+        fetch_opts["filter"] = "blob:none"
+
+    print(f"[git] Fetching {repo_url}@{branch} → {mirror} (depth 1{', blobless' if blobless else ''})")
+    repo.git.fetch("origin", f"+refs/heads/{branch}:refs/heads/{branch}", **fetch_opts)
+    repo.git.gc("--auto", "--quiet")
+    return repo.git.rev_parse(f"refs/heads/{branch}")
+
+
+def _checkout_tree(
+    mirror: Path, commit: str, work_tree: Path, index_file: Path, paths: List[str]
+) -> None:
+    """Write *paths* of *commit* from the bare *mirror* into *work_tree*.
+
+    A private index keeps concurrent checkouts from the same mirror apart.  In a
+    blobless mirror git fetches the missing file contents on demand.
+    """
+    from git import Repo
+
+    work_tree.mkdir(parents=True, exist_ok=True)
+    Repo(str(mirror)).git.checkout(
+        "-f", commit, "--", *paths,
+        env={"GIT_WORK_TREE": str(work_tree.resolve()), "GIT_INDEX_FILE": str(index_file.resolve())},
+    )
+
+
+class MirrorCache:
+    """Persistent bare mirrors of remote repos with a size cap and LRU eviction.
+
+    Each repo URL maps to one bare repository under ``<root>/mirrors``.  Only the
+    configured branch is fetched (depth 1), so a warm run transfers just the
+    commits that changed upstream.  The mtime of a stamp file inside each
+    mirror records when it was last used.
+    """
+
+    STAMP = "merge_docs.stamp"
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int | None = None,
+        offline: bool = False,
+        timings: RunTimings | None = None,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.timings = timings or RunTimings()
+        self._used: Set[Path] = set()
+
+    def mirror_path(self, repo_url: str) -> Path:
+        digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:12]
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", Path(repo_url.rstrip("/")).stem)
+        return self.root / "mirrors" / f"{name}-{digest}.git"
+
+    def lock(self, mirror: Path) -> contextlib.AbstractContextManager:
+        return _file_lock(mirror.with_suffix(".lock"))
+
+    def fetch(self, repo_url: str, branch: str, blobless: bool = False) -> Tuple[Path, str]:
+        """Bring *branch* of *repo_url* up to date and return ``(mirror, commit)``."""
+        mirror = self.mirror_path(repo_url)
+        with self.lock(mirror):
+            before = _dir_size(mirror)
+            commit = _fetch_branch(mirror, repo_url, branch, blobless, self.offline)
+            self.timings.account(max(0, _dir_size(mirror) - before))  # roughly what was transferred
+        (mirror / self.STAMP).touch()
+        self._used.add(mirror)
+        return mirror, commit
+
+    def evict(self) -> None:
+        """Drop least recently used mirrors until the cache fits in ``max_bytes``."""
+        mirrors_dir = self.root / "mirrors"
+        if self.max_bytes is None or not mirrors_dir.is_dir():
+            return
+
+        entries = []
+        for mirror in mirrors_dir.glob("*.git"):
+            stamp = mirror / self.STAMP
+            last_used = stamp.stat().st_mtime if stamp.exists() else 0.0
+            entries.append((last_used, mirror, _dir_size(mirror)))
+
+        total = sum(size for _, _, size in entries)
+        for _, mirror, size in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if mirror in self._used:
+                continue
+            print(f"[cache] Evicting {mirror.name} ({size // 1024} KiB)")
+            with self.lock(mirror):
+                shutil.rmtree(mirror, ignore_errors=True)
+            total -= size
+
 
+class Checkout:
+    """Files of one commit, materialised from a mirror into a work directory.
 
-def _gather_github_top_level(dest_dir: Path) -> List[str]:
+    A full checkout writes the whole tree up front.  A sparse checkout starts
+    empty and :meth:`ensure` writes only the paths a handler asks for, such as
+    ``doc_subdir``, ``docs/reuse`` and include targets found while copying.
+    """
+
+    def __init__(
+        self, root: Path, mirrors: MirrorCache, mirror: Path, commit: str, sparse: bool
+    ) -> None:
+        self.root = root
+        self.commit = commit
+        self.sparse = sparse
+        self._mirrors = mirrors
+        self._mirror = mirror
+        self._index = root.with_suffix(".index")
+        self._tree: Set[str] | None = None
+        self._done: Set[str] = set()
+
+        if not sparse:
+            _checkout_tree(mirror, commit, root, self._index, ["."])
+        else:
+            root.mkdir(parents=True, exist_ok=True)
+
+    def _in_tree(self, rel: str) -> bool:
+        if self._tree is None:
+            from git import Repo
+
+            listing = Repo(str(self._mirror)).git.ls_tree("-r", "-t", "--name-only", self.commit)
+            self._tree = set(listing.splitlines())
+        return rel in self._tree
+
+    def ensure(self, *paths: str | Path) -> None:
+        """Materialise *paths* (files or directories, relative to the repo root)."""
+        if not self.sparse:
+            return
+        wanted: List[str] = []
+        for p in paths:
+            rel = Path(p).as_posix().strip("/") or "."
+            if rel in self._done or (rel != "." and not self._in_tree(rel)):
+                continue
+            wanted.append(rel)
+        if not wanted:
+            return
+        with self._mirrors.lock(self._mirror):
+            _checkout_tree(self._mirror, self.commit, self.root, self._index, wanted)
+        self._done.update(wanted)
+
+    def ensure_file(self, path: Path) -> None:
+        """Materialise the absolute *path* if it lies inside this checkout."""
+        try:
+            rel = path.resolve().relative_to(self.root.resolve())
+        except ValueError:
+            return
+        self.ensure(rel)
+
+
+class RepoCheckouts:
+    """Check out every (repo_url, branch) pair at most once per merge run.
+
+    Several manifest entries usually point at different ``doc_subdir``s of the
+    same repository; they all share the checkout handed out by :meth:`get`.
+    With *sparse* the mirrors are blobless and checkouts start empty.
+    """
+
+    def __init__(self, workdir: Path, mirrors: MirrorCache, sparse: bool = False) -> None:
+        self._workdir = workdir
+        self._mirrors = mirrors
+        self._sparse = sparse
+        self._checkouts: Dict[Tuple[str, str], Checkout] = {}
+        self._lock = threading.Lock()
+        self._slots: Dict[Tuple[str, str], Tuple[threading.Lock, Path]] = {}
+
+    def get(self, repo_url: str, branch: str) -> Checkout:
+        key = (repo_url, branch)
+        with self._lock:
+            if key not in self._slots:
+                work_tree = self._workdir / f"repo-{len(self._slots)}"
+                self._slots[key] = (threading.Lock(), work_tree)
+            key_lock, work_tree = self._slots[key]
+        with key_lock:  # concurrent callers for the same pair wait for one fetch
+            if key not in self._checkouts:
+                mirror, commit = self._mirrors.fetch(repo_url, branch, blobless=self._sparse)
+                self._checkouts[key] = Checkout(work_tree, self._mirrors, mirror, commit, self._sparse)
+            return self._checkouts[key]
+
+    def resolved(self) -> Dict[Tuple[str, str], str]:
+        """Commit SHA of every (repo_url, branch) pair checked out so far."""
+        return {key: co.commit for key, co in self._checkouts.items()}
+
+
+def _gather_github_top_level(src_dir: Path) -> List[str]:
+    """Top-level documents of a full copy of *src_dir*.
+
+    Read from the source tree: the destination may still hold files of an
+    earlier run, or placeholders written by ``--lazy``.
+    """
     for idx in ("index.md", "index.rst"):
-        if (dest_dir / idx).is_file():
+        if (src_dir / idx).is_file():
             return [idx]
-    return [f.name for f in dest_dir.iterdir() if f.is_file() and f.suffix in {".md", ".rst"}]
+    return sorted(f.name for f in src_dir.iterdir() if f.is_file() and f.suffix in {".md", ".rst"})
 
 
-def handle_github_source(src: Dict, full_path: str | Path) -> List[str]:
-    repo_url: str = src["repo_url"]
-    branch: str = src.get("branch", "main")
+def _github_checkout(src: Dict, ctx: MergeContext) -> Checkout:
+    """Return the shared checkout for *src* with the files it reads in place."""
     doc_subdir: str = src.get("doc_subdir", "")
+    checkout = ctx.checkouts.get(src["repo_url"], src.get("branch", "main"))
+    if "pages" in src:
+        checkout.ensure(*(Path(doc_subdir) / page["doc_file"] for page in src["pages"]))
+    else:
+        checkout.ensure(doc_subdir)
+    checkout.ensure("docs/reuse")
+    return checkout
 
-    with tempfile.TemporaryDirectory() as tmp:
-        tmpdir = Path(tmp)
-        _clone_repo_shallow(repo_url, branch, tmpdir)
 
-        src_subdir = tmpdir / doc_subdir
-        if not src_subdir.exists():
-            print(f"[git] Warning: subdir '{doc_subdir}' not found in {repo_url}.")
-            Path(full_path).mkdir(parents=True, exist_ok=True)
-            return []
+def prefetch_github_source(src: Dict, ctx: MergeContext) -> List[Callable[[], object]]:
+    def fetch() -> Checkout:
+        with ctx.timings.stage(src["name"], "clone"):
+            return _github_checkout(src, ctx)
 
-        # Collect reuse/ first using repo name as label (root-level docs/reuse/)
-        repo_label = src.get("reuse_label") or Path(repo_url).stem  # default label
-        _collect_reuse_fragments(repo_label, tmpdir)
+    return [fetch]
 
-        dest_root = Path(full_path)
-        dest_root.mkdir(parents=True, exist_ok=True)
 
-        include_seen: Set[Path] = set()
-        doc_files: List[str] = []
+def handle_github_source(src: Dict, full_path: str | Path, ctx: MergeContext) -> List[str]:
+    repo_url: str = src["repo_url"]
 
+    with ctx.timings.stage(src["name"], "clone"):
+        checkout = _github_checkout(src, ctx)
+    repo_root = checkout.root
+
+    repo_label = src.get("reuse_label") or Path(repo_url).stem  # default label
+    graph = ctx.include_graph(repo_root, checkout)
+    return _merge_tree(src, full_path, ctx, repo_root, graph, (repo_url, checkout.commit), repo_label)
+
+
+def _merge_tree(
+    src: Dict,
+    full_path: str | Path,
+    ctx: MergeContext,
+    repo_root: Path,
+    graph: IncludeGraph,
+    origin: Tuple[str, str],
+    repo_label: str,
+    tag: str = "git",
+) -> List[str]:
+    """Merge the documents of *src* from the tree at *repo_root*.
+
+    Shared by every source type backed by a repo-like tree: ``doc_subdir`` or
+    its ``pages`` are copied, ``docs/reuse/`` is collected (once per
+    *origin*, a ``(location, version)`` pair) and include targets are copied
+    along through *graph*.
+    """
+    doc_subdir: str = src.get("doc_subdir", "")
+    src_subdir = repo_root / doc_subdir
+    if not src_subdir.exists():
+        print(f"[{tag}] Warning: subdir '{doc_subdir}' not found in {origin[0]}.")
+        Path(full_path).mkdir(parents=True, exist_ok=True)
+        return []
+
+    # Collect reuse/ first (root-level docs/reuse/)
+    with ctx.timings.stage(src["name"], "reuse"):
+        ctx.reuse.collect(src["name"], repo_label, *origin, repo_root)
+
+    dest_root = Path(full_path)
+    dest_root.mkdir(parents=True, exist_ok=True)
+
+    copied: List[Tuple[Path, Path]] = []
+    doc_files: List[str] = []
+
+    with ctx.timings.stage(src["name"], "copy"):
         if "pages" in src:  # selective copy
             for page in src["pages"]:
                 in_repo = src_subdir / page["doc_file"]
                 if not in_repo.is_file():
-                    print(f"[git] Warning: '{page['doc_file']}' missing in repo; skipping.")
+                    print(f"[{tag}] Warning: '{page['doc_file']}' missing in repo; skipping.")
                     continue
                 local_name = page.get("filename") or in_repo.name
                 out_file = dest_root / local_name
-                copy_file(in_repo, out_file)
+                ctx.out.copy_file(in_repo, out_file)
                 doc_files.append(local_name)
-
-                _copy_includes_recursive(src_subdir, dest_root, out_file, include_seen)
+                copied.append((in_repo, out_file))
         else:  # full copy of doc_subdir
-            copy_tree(src_subdir, dest_root)
-            for rst in dest_root.rglob("*.rst"):
-                _copy_includes_recursive(src_subdir, dest_root, rst, include_seen)
-            doc_files.extend(_gather_github_top_level(dest_root))
+            ctx.out.copy_tree(src_subdir, dest_root)
+            for in_repo in sorted(src_subdir.rglob("*")):
+                if in_repo.suffix.lower() in _INCLUDING_SUFFIXES and in_repo.is_file():
+                    copied.append((in_repo, dest_root / in_repo.relative_to(src_subdir)))
+            doc_files.extend(_gather_github_top_level(src_subdir))
+
+    with ctx.timings.stage(src["name"], "includes"):
+        graph.copy_closure(copied, ctx.out)
+
+    return doc_files
+
+###############################################################################
+# HTTP client                                                                 #
+###############################################################################
+
+
+def _validators(resp: requests.Response) -> Dict[str, str]:
+    """The ETag/Last-Modified headers of *resp*, keyed ``etag``/``last_modified``."""
+    found = {}
+    for header, field in (("ETag", "etag"), ("Last-Modified", "last_modified")):
+        if resp.headers.get(header):
+            found[field] = resp.headers[header]
+    return found
+
+
+class HttpCache:
+    """On-disk response store keyed by URL, with ETag/Last-Modified validators.
+
+    Every entry is a ``<sha256>.body`` file next to a ``<sha256>.json`` file
+    holding the URL, the validators and the digest of the body.  A *variant*
+    names the transform a body was stored with, so differently processed
+    copies of one URL never mix.  Bodies are
+    streamed into a temporary file and both files are replaced atomically, so
+    parallel fetches and concurrent runs never see half-written entries.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def _paths(self, url: str, variant: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(f"{url}\0{variant}".encode("utf-8")).hexdigest()
+        return self.root / f"{key}.json", self.root / f"{key}.body"
+
+    def load(self, url: str, variant: str = "") -> Tuple[Dict[str, str], Path] | None:
+        """Return ``(meta, body path)`` for *url*, or ``None`` if not cached."""
+        meta_path, body_path = self._paths(url, variant)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return (meta, body_path) if body_path.is_file() else None
+
+    def store(
+        self, url: str, validators: Dict[str, str], chunks: Iterable[str], variant: str = ""
+    ) -> Tuple[Dict[str, str], Path]:
+        """Stream *chunks* into the body for *url* and return ``(meta, body path)``."""
+        meta_path, body_path = self._paths(url, variant)
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f".{body_path.name}.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+                    digest.update(chunk.encode("utf-8"))
+            os.replace(tmp, body_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+        meta = {"url": url, **validators, "sha256": digest.hexdigest()}
+        _write_atomic(meta_path, json.dumps(meta, indent=1))
+        return meta, body_path
+
+
+def _decode_chunks(
+    resp: requests.Response,
+    chunk_size: int = 1 << 16,
+    on_bytes: Callable[[int], None] | None = None,
+) -> Iterator[str]:
+    """Decode the streamed body of *resp* chunk by chunk."""
+    decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if on_bytes is not None:
+            on_bytes(len(chunk))
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class HttpClient:
+    """Pooled, rate-limited HTTP session shared by every Discourse fetch.
+
+    At most *per_host* requests run against one host at a time.  Connection
+    errors and 429/5xx responses are retried with exponential backoff; a
+    ``Retry-After`` header pauses the whole host, not just the failing request.
+    With a *cache*, :meth:`get_file` revalidates cached bodies with conditional
+    requests; *offline* serves them without touching the network.  Without a
+    cache, bodies are spooled under *spool_dir* for the current run.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_HTTP_TIMEOUT,
+        retries: int = DEFAULT_HTTP_RETRIES,
+        per_host: int = DEFAULT_PER_HOST,
+        backoff: float = 0.5,
+        cache: HttpCache | None = None,
+        offline: bool = False,
+        spool_dir: Path | None = None,
+        timings: RunTimings | None = None,
+    ) -> None:
+        self.cache = cache
+        self.offline = offline
+        self.timings = timings or RunTimings()
+        self._spool = HttpCache(spool_dir or Path(tempfile.gettempdir()) / "merge_docs-spool")
+        self.fetched: Dict[str, Dict[str, str]] = {}  # validators + body digest, for the lockfile
+        self.timeout = timeout
+        self.retries = retries
+        self.per_host = max(1, per_host)
+        self.backoff = backoff
+        self._session: requests.Session | None = None
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.Semaphore] = {}
+        self._not_before: Dict[str, float] = {}
+
+    @property
+    def session(self) -> requests.Session:
+        """The pooled session, made on first use so runs without HTTP skip requests."""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.per_host)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    def _slot(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.Semaphore(self.per_host)
+            return self._slots[host]
+
+    def _pause(self, host: str, delay: float) -> None:
+        with self._lock:
+            self._not_before[host] = max(self._not_before.get(host, 0.0), time.monotonic() + delay)
+
+    def _wait(self, host: str) -> None:
+        delay = self._not_before.get(host, 0.0) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _retry_delay(self, attempt: int, resp: requests.Response | None) -> float:
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET *url*, retrying transient failures; raise on a final error status."""
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, allow_redirects=True, **kwargs)
+
+    @contextlib.contextmanager
+    def holding(self, url: str) -> Iterator[None]:
+        """Hold the slot of *url*'s host for the block.
+
+        For streamed responses, whose bodies are read after :meth:`request`
+        returns; requests made in the block pass ``held=True``.
+        """
+        with self._slot(urlsplit(url).netloc):
+            yield
+
+    def request(self, method: str, url: str, held: bool = False, **kwargs) -> requests.Response:
+        import requests
+
+        host = urlsplit(url).netloc
+        with contextlib.nullcontext() if held else self._slot(host):
+            for attempt in range(self.retries + 1):
+                self._wait(host)
+                try:
+                    resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+                    self._pause(host, self._retry_delay(attempt, None))
+                    continue
+                if resp.status_code in _RETRY_STATUSES and attempt < self.retries:
+                    delay = self._retry_delay(attempt, resp)
+                    print(f"[http] {resp.status_code} from {host}; retrying in {delay:.1f}s")
+                    resp.close()
+                    self._pause(host, delay)
+                    continue
+                resp.raise_for_status()
+                return resp
+        raise AssertionError("unreachable")
+
+    def get_file(
+        self, url: str, transform: Callable[[Iterable[str]], Iterable[str]] | None = None
+    ) -> Path:
+        """Stream the body of *url* to disk and return the file it landed in.
+
+        The decoded body is passed through *transform* (which may stop reading
+        early) before it is stored, so cached bodies are stored transformed.
+        The cached copy is reused when the server answers 304 Not Modified.
+        """
+        variant = transform.__name__ if transform is not None else ""
+        cached = self.cache.load(url, variant) if self.cache is not None else None
+        if self.offline:
+            if cached is None:
+                raise RuntimeError(f"{url} is not in the HTTP cache (offline mode)")
+            return self._remember(url, *cached)
+
+        headers: Dict[str, str] = {}
+        if cached is not None:
+            meta = cached[0]
+            if "etag" in meta:
+                headers["If-None-Match"] = meta["etag"]
+            if "last_modified" in meta:
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.holding(url):  # the body counts against the host's limit too
+            resp = self.get(url, held=True, headers=headers, stream=True)
+            try:
+                if resp.status_code == 304 and cached is not None:
+                    return self._remember(url, *cached)
+                chunks: Iterable[str] = _decode_chunks(resp, on_bytes=self.timings.account)
+                if transform is not None:
+                    chunks = transform(chunks)
+                store = self.cache if self.cache is not None else self._spool
+                return self._remember(url, *store.store(url, _validators(resp), chunks, variant))
+            finally:
+                resp.close()  # drops the connection if the transform stopped early
+
+    def _remember(self, url: str, meta: Dict[str, str], body_path: Path) -> Path:
+        self.fetched[url] = {k: meta[k] for k in ("etag", "last_modified", "sha256") if k in meta}
+        return body_path
+
+###############################################################################
+# Local and archive sources                                                   #
+###############################################################################
+
+
+def _local_root(src: Dict, base_dir: Path) -> Path:
+    return (base_dir / Path(src["path"]).expanduser()).resolve()
+
+
+def _local_files(src: Dict, root: Path) -> Set[str]:
+    """Files of *root* a ``local`` source reads, include targets aside.
+
+    That is its ``pages`` or all of ``doc_subdir``, and ``docs/reuse``;
+    relative to *root*, including pages that do not exist.
+    """
+    sub = root / src.get("doc_subdir", "")
+    if "pages" in src:
+        files = {sub / page["doc_file"] for page in src["pages"]}
+    else:
+        files = {f for f in sub.rglob("*") if f.is_file()}
+    files |= {f for f in (root / "docs" / "reuse").rglob("*") if f.is_file()}
+    return {f.relative_to(root).as_posix() for f in files}
+
+
+def _local_digest(root: Path, files: Iterable[str]) -> str:
+    """SHA-256 over the names and contents of *files* below *root* (missing ones too)."""
+    h = hashlib.sha256()
+    for rel in sorted(set(files)):
+        path = root / rel
+        h.update(f"{rel}\0{_file_digest(path) if path.is_file() else '-'}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def handle_local_source(src: Dict, full_path: str | Path, ctx: MergeContext) -> List[str]:
+    """Merge a directory that is already on disk, reading it in place."""
+    root = _local_root(src, ctx.base_dir)
+    if not root.is_dir():
+        print(f"[local] Warning: {root} is not a directory.")
+        Path(full_path).mkdir(parents=True, exist_ok=True)
+        return []
+    label = src.get("reuse_label") or root.name
+    with ctx.out.reading_in_place():  # the files are the user's, not a checkout
+        docs = _merge_tree(
+            src, full_path, ctx, root, ctx.include_graph(root), (str(root), ""), label, "local"
+        )
+    # for the lockfile: include targets are only known after a merge, so keep them
+    files = _local_files(src, root)
+    includes = {
+        f.relative_to(root).as_posix() for f in ctx.out.read_by[src["name"]] if f.is_relative_to(root)
+    } - files
+    ctx.local_trees[src["name"]] = {
+        "path": src["path"],
+        "includes": sorted(includes),
+        "sha256": _local_digest(root, files | includes),
+    }
+    return docs
+
+
+def _archive_path(name: str, strip: int) -> str | None:
+    """*name* of an archive member without its first *strip* components.
+
+    ``None`` for members that would land outside the extraction directory.
+    """
+    parts = PurePosixPath(name).parts[strip:]
+    if not parts or name.startswith("/") or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+def _archive_wanted(rel: str, prefixes: List[str]) -> bool:
+    return any(not p or rel == p or rel.startswith(p + "/") for p in prefixes)
+
+
+def _extract_tar(fileobj, root: Path, prefixes: List[str], strip: int) -> int:
+    """Extract the wanted regular files of a tar stream; return the bytes written."""
+    import tarfile
+
+    written = 0
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tf:  # one pass, no seeking
+        for member in tf:
+            rel = _archive_path(member.name, strip)
+            if rel is None or not member.isfile() or not _archive_wanted(rel, prefixes):
+                continue
+            dest = root / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with tf.extractfile(member) as fh, dest.open("wb") as out:
+                shutil.copyfileobj(fh, out, 1024 * 1024)
+            written += member.size
+    return written
+
+
+def _extract_zip(path: Path, root: Path, prefixes: List[str], strip: int) -> int:
+    """Extract the wanted files of the zip at *path*; return the bytes written."""
+    import zipfile
+
+    written = 0
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            rel = _archive_path(info.filename, strip)
+            if rel is None or info.is_dir() or not _archive_wanted(rel, prefixes):
+                continue
+            dest = root / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with zf.open(info) as fh, dest.open("wb") as out:
+                shutil.copyfileobj(fh, out, 1024 * 1024)
+            written += info.file_size
+    return written
+
+
+def _archive_prefixes(src: Dict) -> Set[str]:
+    """Archive paths *src* reads: ``doc_subdir``, ``docs/reuse`` and ``extract``."""
+    paths = (src.get("doc_subdir", ""), "docs/reuse", *src.get("extract", []))
+    return {p.strip("/") for p in paths}
+
+
+class _HashingReader:
+    """Read-only file object that hashes whatever is read through it."""
+
+    def __init__(self, raw) -> None:
+        self._raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self.sha256.update(data)
+        return data
+
+    def drain(self) -> str:
+        """Read the rest of the stream; return the digest of all of it."""
+        while self.read(1 << 20):
+            pass
+        return self.sha256.hexdigest()
+
+
+class ArchiveTrees:
+    """Extract every archive at most once per merge run.
+
+    Sources that read the same archive share one extraction holding the
+    members all of them need.  Tarballs are read as a stream, straight from
+    the HTTP response for URLs; zips need random access, so remote ones are
+    spooled to disk first.  The digest of every archive, and the validators
+    of downloaded ones, are kept in :attr:`fetched` for the lockfile.
+    """
 
-        return doc_files
+    def __init__(
+        self, workdir: Path, http: HttpClient, base_dir: Path, sources: List[Dict], timings: RunTimings
+    ) -> None:
+        self._workdir = workdir
+        self._http = http
+        self._base_dir = base_dir
+        self._timings = timings
+        self._wanted: Dict[Tuple[str, int], Set[str]] = defaultdict(set)
+        for src in sources:
+            if src.get("type") == "archive":
+                self._wanted[self._key(src)] |= _archive_prefixes(src)
+        self._trees: Dict[Tuple[str, int], Path] = {}
+        self._lock = threading.Lock()
+        self._slots: Dict[Tuple[str, int], threading.Lock] = {}
+        self.fetched: Dict[str, Dict[str, str]] = {}  # location -> sha256 (+ validators)
+
+    @staticmethod
+    def _key(src: Dict) -> Tuple[str, int]:
+        return src["archive"], int(src.get("strip_components", 0))
+
+    def get(self, src: Dict) -> Path:
+        """The extracted tree *src* reads from."""
+        key = self._key(src)
+        with self._lock:
+            key_lock = self._slots.setdefault(key, threading.Lock())
+        with key_lock:  # concurrent callers for the same archive wait for one extraction
+            if key not in self._trees:
+                root = self._workdir / f"archive-{len(self._slots)}"
+                self._extract(src, root, sorted(self._wanted[key] | _archive_prefixes(src)))
+                self._trees[key] = root
+            return self._trees[key]
+
+    def _extract(self, src: Dict, root: Path, prefixes: List[str]) -> None:
+        location, strip = self._key(src)
+        root.mkdir(parents=True, exist_ok=True)
+        is_zip = src.get("format", "zip" if location.lower().endswith(".zip") else "tar") == "zip"
+        if urlsplit(location).scheme not in ("http", "https"):
+            path = self._base_dir / Path(location).expanduser()
+            print(f"[archive] Extracting {path}")
+            if is_zip:
+                written = _extract_zip(path, root, prefixes, strip)
+            else:
+                with path.open("rb") as fh:
+                    written = _extract_tar(fh, root, prefixes, strip)
+            self.fetched[location] = {"sha256": _file_digest(path)}
+        elif self._http.offline:
+            raise RuntimeError(f"{location} cannot be downloaded in offline mode")
+        else:
+            print(f"[archive] Fetching {location}")
+            with self._http.holding(location):
+                resp = self._http.get(location, held=True, stream=True)
+                try:
+                    resp.raw.decode_content = True  # undo Content-Encoding, not the archive's own compression
+                    body = _HashingReader(resp.raw)
+                    if is_zip:
+                        spool = root.with_suffix(".zip")
+                        with spool.open("wb") as out:
+                            shutil.copyfileobj(body, out, 1024 * 1024)
+                    else:
+                        written = _extract_tar(body, root, prefixes, strip)
+                    self.fetched[location] = {**_validators(resp), "sha256": body.drain()}
+                finally:
+                    resp.close()
+            if is_zip:  # the download is done; extracting needs no connection
+                written = _extract_zip(spool, root, prefixes, strip)
+                spool.unlink()
+        self._timings.account(nbytes=written)
+
+
+def prefetch_archive_source(src: Dict, ctx: MergeContext) -> List[Callable[[], object]]:
+    def fetch() -> Path:
+        with ctx.timings.stage(src["name"], "clone"):
+            return ctx.archives.get(src)
+
+    return [fetch]
+
+
+def handle_archive_source(src: Dict, full_path: str | Path, ctx: MergeContext) -> List[str]:
+    with ctx.timings.stage(src["name"], "clone"):
+        root = ctx.archives.get(src)
+    name = PurePosixPath(urlsplit(src["archive"]).path).name
+    label = src.get("reuse_label") or re.sub(r"\.(zip|tgz|tbz2|txz|tar(\.\w+)?)$", "", name)
+    return _merge_tree(
+        src, full_path, ctx, root, ctx.include_graph(root), (src["archive"], ""), label, "archive"
+    )
 
 ###############################################################################
-# Discourse (unchanged)                                                       #
+# Discourse                                                                   #
 ###############################################################################
 
-def fetch_discourse_topic(base_url: str, topic_id: int, title: str) -> str:
+_CUTOFF_MARKER = "-------------------------"
+
+
+def _cut_at_marker(chunks: Iterable[str]) -> Iterator[str]:
+    """Pass *chunks* through up to the first ``_CUTOFF_MARKER``.
+
+    Whitespace in front of the marker is dropped, and nothing after it is
+    read, so only the topic body (not the comment thread) is transferred.
+    """
+    hold = len(_CUTOFF_MARKER) - 1
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        idx = buf.find(_CUTOFF_MARKER)
+        if idx != -1:
+            head = buf[:idx].rstrip()
+            if head:
+                yield head
+            return
+        # Keep back a possible marker prefix and the whitespace in front of it.
+        safe = len(buf[: max(0, len(buf) - hold)].rstrip())
+        if safe > 0:
+            yield buf[:safe]
+            buf = buf[safe:]
+    if buf:
+        yield buf
+
+
+def _topic_chunks(title: str, body_path: Path) -> Iterator[str]:
+    """Yield the Markdown page for a topic: a title heading, then the body."""
+    with body_path.open("r", encoding="utf-8", newline="") as fh:
+        chunk = fh.read(1 << 16)
+        if not chunk:
+            yield f"# {title}"
+            return
+        yield f"# {title}\n\n"
+        while chunk:
+            yield chunk
+            chunk = fh.read(1 << 16)
+
+
+def _fetch_topic_body(base_url: str, topic_id: int, client: HttpClient) -> Path:
     url = f"{base_url}/raw/{topic_id}"
     print(f"[disc] Fetch {url}")
-    resp = requests.get(url)
-    resp.raise_for_status()
+    return client.get_file(url, _cut_at_marker)
+
 
-    content = f"# {title}\n\n" + resp.text
-    cutoff_index = content.find("-------------------------")
-    if cutoff_index != -1:
-        content = content[:cutoff_index].rstrip()
-    return content
+def fetch_discourse_topic(
+    base_url: str, topic_id: int, title: str, client: HttpClient | None = None
+) -> str:
+    body_path = _fetch_topic_body(base_url, topic_id, client or HttpClient())
+    return "".join(_topic_chunks(title, body_path))
 
 
-def create_discourse_index(directory: Path, section_name: str, pages: List[Dict]) -> str | None:
+def create_discourse_index(
+    directory: Path, section_name: str, pages: List[Dict], writer: OutputWriter | None = None
+) -> str | None:
     if not directory.is_dir():
         return None
 
@@ -243,21 +1743,33 @@ def create_discourse_index(directory: Path, section_name: str, pages: List[Dict]
         lines.append(f"{base}\n")
         lines.append("```\n\n")
 
-    index_path = directory / "index.md"
-    with index_path.open("w", encoding="utf-8") as f:
-        f.writelines(lines)
+    (writer or OutputWriter(directory)).write_text(directory / "index.md", "".join(lines))
     return "index.md"
 
 
-def handle_discourse_source(src: Dict, full_path: str | Path) -> List[str]:
+def _discourse_topic(src: Dict, page: Dict, ctx: MergeContext) -> Path:
+    """Return the stored body of *page*, fetching it unless it was prefetched."""
+    key = (src["discourse_url"], page["topic_id"])
+    if key not in ctx.topics:
+        with ctx.timings.stage(src["name"], "discourse"):
+            ctx.topics[key] = _fetch_topic_body(*key, client=ctx.http)
+    return ctx.topics[key]
+
+
+def prefetch_discourse_source(src: Dict, ctx: MergeContext) -> List[Callable[[], object]]:
+    return [lambda p=p: _discourse_topic(src, p, ctx) for p in src.get("pages", [])]
+
+
+def handle_discourse_source(src: Dict, full_path: str | Path, ctx: MergeContext) -> List[str]:
     dest = Path(full_path)
     dest.mkdir(parents=True, exist_ok=True)
     for p in src.get("pages", []):
-        md_text = fetch_discourse_topic(src["discourse_url"], p["topic_id"], p["title"])
+        body_path = _discourse_topic(src, p, ctx)
         fname = p.get("filename", f"{p['topic_id']}.md")
-        with (dest / fname).open("w", encoding="utf-8") as fmd:
-            fmd.write(md_text)
-    idx = create_discourse_index(dest, src["name"], src["pages"])
+        with ctx.timings.stage(src["name"], "copy"):
+            ctx.out.write_chunks(dest / fname, _topic_chunks(p["title"], body_path))
+    with ctx.timings.stage(src["name"], "index"):
+        idx = create_discourse_index(dest, src["name"], src["pages"], ctx.out)
     return [idx] if idx else []
 
 
@@ -265,26 +1777,178 @@ def handle_discourse_source(src: Dict, full_path: str | Path) -> List[str]:
 # Public API                                                                  #
 ###############################################################################
 
-TOC_BUILDERS = {
-    "github": lambda n, d, f: [f"{d}/{df}" if d else df for df in f]
-    if len(f) > 1
-    else [f"{n} <{d}/{f[0]}>" if d else f"{n} <{f[0]}>"],
-    "discourse": lambda n, d, f: [
-        f"{n} <{d}/{df}>" if d else f"{n} <{df}>" for df in f
-    ],
-}
+def _toc_github(n: str, d: str, f: List[str]) -> List[str]:
+    if len(f) > 1:
+        return [f"{d}/{df}" if d else df for df in f]
+    return [f"{n} <{d}/{f[0]}>" if d else f"{n} <{f[0]}>"]
+
+
+def _toc_titled(n: str, d: str, f: List[str]) -> List[str]:
+    return [f"{n} <{d}/{df}>" if d else f"{n} <{df}>" for df in f]
+
+
+class SourceType:
+    """How sources of one manifest ``type:`` are merged.
+
+    *handle* ``(src, full_path, ctx)`` merges a source and returns its
+    documents; *toc* ``(name, dest_dir, docs)`` turns them into toctree
+    entries; the optional *prefetch* ``(src, ctx)`` returns the network work
+    that can run ahead of the handlers when ``--jobs`` > 1.  Handlers import
+    their own dependencies, so a type costs nothing until a manifest uses it.
+
+    *fields* and *page_fields* map the keys a source and each of its
+    ``pages`` may have to ``(type, required)``; manifests are validated
+    against them.  ``None`` (the default for plugins) accepts any keys.
+    """
 
-SOURCE_HANDLERS = {
-    "github": handle_github_source,
-    "discourse": handle_discourse_source,
+    def __init__(
+        self,
+        handle: Callable[[Dict, str | Path, "MergeContext"], List[str]],
+        toc: Callable[[str, str, List[str]], List[str]] = _toc_titled,
+        prefetch: Callable[[Dict, "MergeContext"], List[Callable[[], object]]] | None = None,
+        fields: Dict[str, Tuple[type, bool]] | None = None,
+        page_fields: Dict[str, Tuple[type, bool]] | None = None,
+    ) -> None:
+        self.handle = handle
+        self.toc = toc
+        self.prefetch = prefetch
+        self.fields = fields
+        self.page_fields = page_fields
+
+
+# Keys of sources copied from a repo-like tree (github, local, archive)
+_TREE_FIELDS: Dict[str, Tuple[type, bool]] = {
+    "doc_subdir": (str, False),
+    "pages": (list, False),
+    "reuse_label": (str, False),
 }
+_TREE_PAGE_FIELDS: Dict[str, Tuple[type, bool]] = {"doc_file": (str, True), "filename": (str, False)}
+
+
+SOURCE_TYPES: Dict[str, SourceType] = {
+    "github": SourceType(
+        handle_github_source, _toc_github, prefetch_github_source,
+        {"repo_url": (str, True), "branch": (str, False), **_TREE_FIELDS}, _TREE_PAGE_FIELDS,
+    ),
+    "discourse": SourceType(
+        handle_discourse_source, _toc_titled, prefetch_discourse_source,
+        {"discourse_url": (str, True), "pages": (list, True)},
+        {"topic_id": (int, True), "title": (str, True), "filename": (str, True)},
+    ),
+    "local": SourceType(
+        handle_local_source, _toc_github, None, {"path": (str, True), **_TREE_FIELDS}, _TREE_PAGE_FIELDS
+    ),
+    "archive": SourceType(
+        handle_archive_source, _toc_github, prefetch_archive_source,
+        {
+            "archive": (str, True),
+            "strip_components": (int, False),
+            "format": (str, False),
+            "extract": (list, False),
+            **_TREE_FIELDS,
+        },
+        _TREE_PAGE_FIELDS,
+    ),
+}
+
+# Plugins add types with an entry point in this group, named after the type,
+# that loads a SourceType (or a bare handler, listed like Discourse pages).
+ENTRY_POINT_GROUP = "merge_docs.sources"
+_PLUGINS_LOADED: Set[str] = set()
+
+
+def register_source_type(name: str, source_type: SourceType) -> None:
+    """Make *source_type* handle manifest entries with ``type: name``."""
+    SOURCE_TYPES[name] = source_type
+
+
+def source_type(name: str) -> SourceType | None:
+    """The source type registered as *name*, or from a ``merge_docs.sources`` plugin."""
+    if name not in SOURCE_TYPES and name not in _PLUGINS_LOADED:
+        _PLUGINS_LOADED.add(name)
+        from importlib.metadata import entry_points
+
+        for ep in entry_points(group=ENTRY_POINT_GROUP, name=name):
+            loaded = ep.load()
+            register_source_type(name, loaded if isinstance(loaded, SourceType) else SourceType(loaded))
+            break
+    return SOURCE_TYPES.get(name)
 
 ###############################################################################
-# Index generation (unchanged)                                                #
+# Index generation                                                            #
 ###############################################################################
 
 
-def build_all_indices(output_dir: Path, source_entries: List[Dict]) -> None:
+def _source_dest(src: Dict, output_dir: Path) -> Tuple[Path, str | None, str]:
+    """``(full_path, category, dest_dir)`` of manifest entry *src*."""
+    category = src.get("category")
+    raw_dest = src.get("dest_dir", "").rstrip("/")
+    base = output_dir / category if category else output_dir
+    return (base / raw_dest if raw_dest else base), category, raw_dest
+
+
+def _expected_docs(src: Dict) -> List[str]:
+    """Best guess at what a handler returns for *src*, before it has run."""
+    if "pages" in src and all("doc_file" in p for p in src["pages"]):
+        return [p.get("filename") or Path(p["doc_file"]).name for p in src["pages"]]
+    return ["index.md"]
+
+
+def _placeholder(path: Path, title: str) -> str:
+    note = "This page is still being fetched by ``merge_docs --lazy``."
+    if path.suffix == ".rst":
+        return f"{title}\n{'=' * len(title)}\n\n{note}\n"
+    return f"# {title}\n\n{note}\n"
+
+
+def write_skeleton(
+    output_dir: Path, sources: List[Dict], writer: OutputWriter
+) -> Tuple[List[Dict], List[Path]]:
+    """Write the indices for *sources* before any of them is merged.
+
+    Entries saved by the previous run are reused; otherwise the documents are
+    guessed from the manifest.  Pages that do not exist yet get placeholders,
+    which are returned along with the index entries so the caller can drop
+    the ones no source replaced.
+    """
+    previous = {
+        (e["name"], e.get("category"), e["dest_dir"]): e
+        for e in writer.previous_state().get("sources", [])
+    }
+    entries: List[Dict] = []
+    placeholders: List[Path] = []
+    for src in sources:
+        if source_type(src["type"]) is None:
+            continue
+        full_path, category, raw_dest = _source_dest(src, output_dir)
+        entry = previous.get((src["name"], category, raw_dest)) or {
+            "type": src["type"],
+            "name": src["name"],
+            "category": category,
+            "dest_dir": raw_dest,
+            "docs": _expected_docs(src),
+        }
+        pages = {doc: src["name"] for doc in entry["docs"]}
+        if src["type"] == "discourse":
+            for page in src.get("pages", []):
+                pages[page.get("filename", f"{page['topic_id']}.md")] = page["title"]
+        for doc, title in pages.items():
+            path = full_path / doc
+            if not path.exists():
+                _write_atomic(path, _placeholder(path, title))
+                placeholders.append(path)
+        if src["type"] == "discourse" and full_path / "index.md" in placeholders:
+            create_discourse_index(full_path, src["name"], src["pages"], OutputWriter(full_path))
+        entries.append(entry)
+
+    build_all_indices(output_dir, entries, writer)
+    return entries, placeholders
+
+
+def build_all_indices(
+    output_dir: Path, source_entries: List[Dict], writer: OutputWriter | None = None
+) -> None:
+    writer = writer or OutputWriter(output_dir)
     cat_map: Dict[str | None, List[Dict]] = defaultdict(list)
     for e in source_entries:
         cat_map[e.get("category")].append(e)
@@ -303,84 +1967,763 @@ def build_all_indices(output_dir: Path, source_entries: List[Dict]) -> None:
     for src in cat_map.get(None, []):
         if not src["docs"]:
             continue
-        builder = TOC_BUILDERS.get(src["type"])
-        if not builder:
+        stype = source_type(src["type"])
+        if stype is None:
             continue
         lines.append("```{toctree}\n:maxdepth: 1\n\n")
         lines.extend(
-            [ln + "\n" for ln in builder(src["name"], src["dest_dir"], src["docs"])]
+            [ln + "\n" for ln in stype.toc(src["name"], src["dest_dir"], src["docs"])]
         )
         lines.append("\n```\n\n")
 
-    with root_index.open("w", encoding="utf-8") as f:
-        f.writelines(lines)
+    writer.write_text(root_index, "".join(lines))
 
     # Category sub‑indices
     for cat in categories:
-        cat_dir = output_dir / cat
-        (cat_dir).mkdir(parents=True, exist_ok=True)
-        cat_index_path = cat_dir / "index.md"
+        cat_index_path = output_dir / cat / "index.md"
 
         lines_cat: List[str] = [f"# {cat}\n\n"]
         for src in cat_map[cat]:
             if not src["docs"]:
                 continue
-            builder = TOC_BUILDERS.get(src["type"])
-            if not builder:
+            stype = source_type(src["type"])
+            if stype is None:
                 continue
             lines_cat.append("```{toctree}\n:maxdepth: 1\n\n")
             lines_cat.extend(
-                [ln + "\n" for ln in builder(src["name"], src["dest_dir"], src["docs"])]
+                [ln + "\n" for ln in stype.toc(src["name"], src["dest_dir"], src["docs"])]
             )
             lines_cat.append("\n```\n\n")
 
-        with cat_index_path.open("w", encoding="utf-8") as f:
-            f.writelines(lines_cat)
+        writer.write_text(cat_index_path, "".join(lines_cat))
 
 
 ###############################################################################
-# Orchestrator                                                                #
+# Lockfile                                                                    #
 ###############################################################################
 
 
-def merge_docs(manifest_path: str | Path, output_dir: str | Path) -> None:
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+def write_lockfile(
+    lock_path: Path, manifest_path: Path, ctx: MergeContext, update: bool = False
+) -> None:
+    """Record the commit of every repo and the body digest of every topic.
+
+    ``local`` sources get a digest of the files they read and archives their
+    digest (plus HTTP validators for URLs).  With *update*, entries of the
+    existing lockfile that this run did not fetch are kept (for runs that
+    merged only some sources).
+    """
+    repos: Dict[Tuple[str, str], str] = {}
+    topics: Dict[str, Dict[str, str]] = {}
+    trees: Dict[str, Dict] = {}
+    archives: Dict[str, Dict[str, str]] = {}
+    import yaml
+
+    def rest(entry: Dict, key: str) -> Dict:
+        return {k: v for k, v in entry.items() if k != key}
+
+    if update:
+        with contextlib.suppress(OSError):
+            old = yaml.safe_load(lock_path.read_text(encoding="utf-8")) or {}
+            repos = {(e["repo_url"], e["branch"]): e["commit"] for e in old.get("github", [])}
+            topics = {e["url"]: rest(e, "url") for e in old.get("discourse", [])}
+            trees = {e["name"]: rest(e, "name") for e in old.get("local", [])}
+            archives = {e["archive"]: rest(e, "archive") for e in old.get("archive", [])}
+    repos.update(ctx.checkouts.resolved())
+    topics.update(ctx.http.fetched)
+    trees.update(ctx.local_trees)
+    archives.update(ctx.archives.fetched)
+    lock: Dict[str, object] = {
+        "manifest_sha256": _file_digest(manifest_path),
+        "github": [
+            {"repo_url": url, "branch": branch, "commit": commit}
+            for (url, branch), commit in sorted(repos.items())
+        ],
+        "discourse": [{"url": url, **entry} for url, entry in sorted(topics.items())],
+    }
+    if trees:
+        lock["local"] = [{"name": name, **entry} for name, entry in sorted(trees.items())]
+    if archives:
+        lock["archive"] = [{"archive": loc, **entry} for loc, entry in sorted(archives.items())]
+    _write_atomic(lock_path, yaml.safe_dump(lock, sort_keys=False))
+
+
+class UpstreamError(RuntimeError):
+    """Upstream could not be compared with the lockfile (unreachable host, ...)."""
+
+
+def _remote_commit(repo_url: str, branch: str, timeout: float | None = None) -> str | None:
+    out = subprocess.run(
+        ["git", "ls-remote", repo_url, f"refs/heads/{branch}"],
+        capture_output=True, text=True, check=True, timeout=timeout,
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    ).stdout
+    return out.split()[0] if out else None
+
+
+def _run_check(reason: str, changed: Callable[[], bool]) -> bool:
+    """``changed()``, with network and git failures raised as :class:`UpstreamError`."""
+    try:
+        return changed()
+    except subprocess.CalledProcessError as exc:
+        detail = (exc.stderr or "").strip().splitlines()  # git's first line says what failed
+        raise UpstreamError(f"could not tell whether {reason}: {detail[0] if detail else exc}") from None
+    except (OSError, subprocess.SubprocessError) as exc:  # requests' errors are OSErrors
+        raise UpstreamError(f"could not tell whether {reason}: {exc}") from None
 
-    with Path(manifest_path).open(encoding="utf-8") as f:
-        config = yaml.safe_load(f)
 
-    source_entries: List[Dict] = []
+def _topic_changed(client: HttpClient, entry: Dict[str, str]) -> bool:
+    """Whether the topic at ``entry["url"]`` differs from the locked version.
+
+    A HEAD request settles it when the server sends the same kind of validator
+    as the lockfile holds; otherwise the body is fetched and hashed.
+    """
+    resp = client.head(entry["url"])
+    current = _validators(resp)
+    for field in ("etag", "last_modified"):
+        if field in entry and field in current:
+            return entry[field] != current[field]
+    client.get_file(entry["url"], _cut_at_marker)
+    return client.fetched[entry["url"]].get("sha256") != entry.get("sha256")
+
+
+def _local_changed(src: Dict, entry: Dict, base_dir: Path) -> bool:
+    root = _local_root(src, base_dir)
+    files = _local_files(src, root) | set(entry.get("includes", []))
+    return _local_digest(root, files) != entry.get("sha256")
+
+
+def _archive_changed(client: HttpClient, location: str, entry: Dict[str, str], base_dir: Path) -> bool:
+    """Whether the archive at *location* differs from the locked one.
+
+    Files are hashed; URLs are settled by a HEAD request when the validators
+    can be compared, otherwise the archive is downloaded and hashed.
+    """
+    if urlsplit(location).scheme not in ("http", "https"):
+        return _file_digest(base_dir / Path(location).expanduser()) != entry.get("sha256")
+    current = _validators(client.head(location))
+    for field in ("etag", "last_modified"):
+        if field in entry and field in current:
+            return entry[field] != current[field]
+    with client.holding(location):
+        resp = client.get(location, held=True, stream=True)
+        try:
+            resp.raw.decode_content = True
+            return _HashingReader(resp.raw).drain() != entry.get("sha256")
+        finally:
+            resp.close()
+
+
+def check_upstream(
+    manifest_path: str | Path,
+    lock_path: str | Path,
+    jobs: int = 8,
+    client: HttpClient | None = None,
+    timeout: float | None = None,
+) -> List[str]:
+    """Compare upstream against *lock_path* without cloning anything.
+
+    Returns the reasons a pull is needed; an empty list means the merged tree
+    is still current.  Raises :class:`UpstreamError` when a repository or
+    topic cannot be reached; *timeout* bounds each ``git ls-remote``.
+    """
+    return upstream_changes(manifest_path, lock_path, jobs, client, timeout)[0]
+
+
+def upstream_changes(
+    manifest_path: str | Path,
+    lock_path: str | Path,
+    jobs: int = 8,
+    client: HttpClient | None = None,
+    timeout: float | None = None,
+) -> Tuple[List[str], Set[str] | None]:
+    """Like :func:`check_upstream`, but also name the sources that changed.
+
+    Returns ``(reasons, sources)``; *sources* is ``None`` when every source
+    has to be merged again (no lockfile, or the manifest itself changed).
+    """
+    import yaml
+
+    manifest_path, lock_path = Path(manifest_path), Path(lock_path)
+    try:
+        lock = yaml.safe_load(lock_path.read_text(encoding="utf-8")) or {}
+    except OSError:
+        return [f"no lockfile at {lock_path}"], None
+    if lock.get("manifest_sha256") != _file_digest(manifest_path):
+        return [f"{manifest_path} changed since the last pull"], None
+
+    sources = load_manifest(manifest_path)
+    base_dir = manifest_path.resolve().parent  # as in merge_docs()
+    locked_repos = {(e["repo_url"], e["branch"]): e["commit"] for e in lock.get("github", [])}
+    locked_topics = {e["url"]: e for e in lock.get("discourse", [])}
+    locked_trees = {e["name"]: e for e in lock.get("local", [])}
+    locked_archives = {e["archive"]: e for e in lock.get("archive", [])}
+
+    client = client or HttpClient()
+    checks: List[Tuple[str, Callable[[], bool]]] = []
+    users: Dict[str, Set[str]] = defaultdict(set)  # reason -> sources it affects
+    repos: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+    for src in sources:
+        if src.get("type") == "github":
+            repos[(src["repo_url"], src.get("branch", "main"))].add(src["name"])
+    for key in sorted(repos):
+        if key not in locked_repos:
+            return [f"{key[0]}@{key[1]} is not in the lockfile"], None
+        reason = f"{key[0]}@{key[1]} moved"
+        users[reason] |= repos[key]
+        checks.append((reason, lambda k=key: _remote_commit(*k, timeout) != locked_repos[k]))
+    for src in sources:
+        if src.get("type") != "discourse":
+            continue
+        for page in src.get("pages", []):
+            url = f"{src['discourse_url']}/raw/{page['topic_id']}"
+            if url not in locked_topics:
+                return [f"{url} is not in the lockfile"], None
+            entry = locked_topics[url]
+            users[f"{url} changed"].add(src["name"])
+            checks.append((f"{url} changed", lambda e=entry: _topic_changed(client, e)))
+    archives: Dict[str, Set[str]] = defaultdict(set)
+    for src in sources:
+        if src.get("type") == "local":
+            if src["name"] not in locked_trees:
+                return [f"local source {src['name']} is not in the lockfile"], None
+            reason = f"local source {src['name']} changed"
+            users[reason].add(src["name"])
+            checks.append(
+                (reason, lambda s=src: _local_changed(s, locked_trees[s["name"]], base_dir))
+            )
+        elif src.get("type") == "archive":
+            archives[src["archive"]].add(src["name"])
+    for location in sorted(archives):
+        if location not in locked_archives:
+            return [f"{location} is not in the lockfile"], None
+        users[f"{location} changed"] |= archives[location]
+        checks.append(
+            (f"{location} changed",
+             lambda loc=location: _archive_changed(client, loc, locked_archives[loc], base_dir))
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        results = list(pool.map(lambda check: _run_check(*check), checks))
+    reasons = [reason for (reason, _), changed in zip(checks, results) if changed]
+    return reasons, set().union(*(users[r] for r in reasons))
+
+
+def watch(
+    manifest_path: str | Path,
+    lock_path: str | Path,
+    interval: float,
+    merge: Callable[[Set[str] | None], object],
+    jobs: int = 8,
+    client: HttpClient | None = None,
+) -> None:
+    """Merge once, then poll upstream every *interval* seconds, forever.
+
+    ``merge(sources)`` is called with the names of the sources that changed,
+    or ``None`` for a full merge.  Failed checks and merges are reported and
+    retried at the next poll.
+    """
+    pending: Set[str] | None = None
+    while True:
+        try:
+            merge(pending)
+        except Exception as exc:  # keep watching; upstream may be briefly broken
+            print(f"[watch] Merge failed: {exc}")
+        print(f"[watch] Next check in {interval:g}s")
+        while True:
+            time.sleep(interval)
+            try:
+                reasons, pending = upstream_changes(manifest_path, lock_path, jobs, client)
+            except Exception as exc:
+                print(f"[watch] Check failed: {exc}")
+                continue
+            if reasons:
+                break
+        for reason in reasons:
+            print(f"[watch] {reason}")
+
+
+###############################################################################
+# Manifest validation and plan                                                #
+###############################################################################
+
+# Keys every source may have, whatever its type
+_COMMON_FIELDS: Dict[str, Tuple[type, bool]] = {
+    "name": (str, True),
+    "type": (str, True),
+    "dest_dir": (str, False),
+    "category": (str, False),
+}
+_KIND_NAMES = {str: "a string", int: "an integer", list: "a list", dict: "a mapping"}
+
+
+class ManifestError(RuntimeError):
+    """The manifest is not valid; :attr:`problems` lists everything found."""
+
+    def __init__(self, manifest: str | Path, problems: List[str]) -> None:
+        super().__init__(f"{manifest}: " + "; ".join(problems))
+        self.manifest = manifest
+        self.problems = problems
+
+
+def _check_fields(
+    where: str, entry: Dict, fields: Dict[str, Tuple[type, bool]], problems: List[str], strict: bool = True
+) -> None:
+    for key in entry:
+        if strict and key not in fields:
+            close = difflib.get_close_matches(str(key), fields, n=1)
+            hint = f" (did you mean '{close[0]}'?)" if close else ""
+            problems.append(f"{where}: unknown key '{key}'{hint}")
+    for key, (kind, required) in fields.items():
+        if key not in entry:
+            if required:
+                problems.append(f"{where}: missing '{key}'")
+        elif not isinstance(entry[key], kind) or (kind is int and isinstance(entry[key], bool)):
+            problems.append(
+                f"{where}: '{key}' must be {_KIND_NAMES[kind]}, not {type(entry[key]).__name__}"
+            )
+
+
+def _planned_files(src: Dict) -> List[str] | None:
+    """Files *src* writes below its destination, or ``None`` for a whole tree."""
+    if src["type"] == "discourse":
+        return ["index.md", *(p["filename"] for p in src["pages"])]
+    if "pages" in src and all("doc_file" in p for p in src["pages"]):
+        return [p.get("filename") or PurePosixPath(p["doc_file"]).name for p in src["pages"]]
+    return None
 
-    for src in config.get("sources", []):
-        stype = src["type"]
-        handler = SOURCE_HANDLERS.get(stype)
-        if handler is None:
-            print(f"[warn] No handler for source type '{stype}'. Skipping…")
+
+def _dest(src: Dict) -> str:
+    rel = _source_dest(src, Path())[0].as_posix()
+    return "" if rel == "." else rel
+
+
+def _under(path: str, directory: str) -> bool:
+    return not directory or path == directory or path.startswith(directory + "/")
+
+
+def validate_manifest(config: object, manifest: str | Path = "manifest") -> List[Dict]:
+    """Check *config* (a loaded manifest) and return its sources.
+
+    Every problem is collected before :class:`ManifestError` is raised, so
+    one run reports all of them.
+    """
+    if not isinstance(config, dict) or not isinstance(config.get("sources"), list):
+        raise ManifestError(manifest, ["expected a mapping with a 'sources' list"])
+    problems: List[str] = []
+    if set(config) - {"sources"}:
+        problems.append(f"unknown top-level keys: {', '.join(sorted(map(str, set(config) - {'sources'})))}")
+    sources: List[Dict] = config["sources"]
+    names: Dict[str, int] = {}
+    for i, src in enumerate(sources):
+        where = f"sources[{i}]"
+        if not isinstance(src, dict):
+            problems.append(f"{where}: expected a mapping")
             continue
+        if isinstance(src.get("name"), str):
+            where += f" ({src['name']})"
+            if src["name"] in names:
+                problems.append(f"{where}: name already used by sources[{names[src['name']]}]")
+            names.setdefault(src["name"], i)
+        stype = source_type(src["type"]) if isinstance(src.get("type"), str) else None
+        if isinstance(src.get("type"), str) and stype is None:
+            close = difflib.get_close_matches(src["type"], SOURCE_TYPES, n=1)
+            hint = f" (did you mean '{close[0]}'?)" if close else ""
+            problems.append(f"{where}: unknown source type '{src['type']}'{hint}")
+        fields = {**_COMMON_FIELDS, **(stype.fields or {})} if stype is not None else _COMMON_FIELDS
+        _check_fields(where, src, fields, problems, strict=stype is not None and stype.fields is not None)
+        if stype is None or stype.page_fields is None or not isinstance(src.get("pages"), list):
+            continue
+        for j, page in enumerate(src["pages"]):
+            if isinstance(page, dict):
+                _check_fields(f"{where} pages[{j}]", page, stype.page_fields, problems)
+            else:
+                problems.append(f"{where} pages[{j}]: expected a mapping")
+    if problems:  # collisions are only worth checking on well-formed sources
+        raise ManifestError(manifest, problems)
+
+    # What every source writes, relative to the output directory
+    claims = [(src, _dest(src), _planned_files(src)) for src in sources]
+    reserved = {"index.md": "the root index", "reuse/links.txt": "reuse/", "reuse/substitutions.txt": "reuse/"}
+    reserved.update({f"{c}/index.md": f"the {c} index" for c in {s.get("category") for s in sources} if c})
+    for src, dest, files in claims:
+        written = None if files is None else {f"{dest}/{f}".lstrip("/") for f in files}
+        for path, what in reserved.items():
+            if _under(path, dest) if written is None else path in written:
+                problems.append(f"{src['name']}: writes {path}, which is {what}")
+    for i, (a, dest_a, files_a) in enumerate(claims):
+        for b, dest_b, files_b in claims[i + 1:]:
+            if dest_a == dest_b and files_a is not None and files_b is not None:
+                for name in sorted(set(files_a) & set(files_b)):
+                    problems.append(f"{a['name']} and {b['name']} both write {f'{dest_a}/{name}'.lstrip('/')}")
+            elif dest_a == dest_b:
+                problems.append(f"{a['name']} and {b['name']} both write into {dest_a or '.'}/")
+    if problems:
+        raise ManifestError(manifest, problems)
+    return sources
+
+
+def overlaps(sources: List[Dict]) -> List[str]:
+    """Sources whose destination lies inside another source's copied tree.
+
+    Not an error: they only clash if the outer tree has the inner directory.
+    """
+    found: List[str] = []
+    claims = [(src, _dest(src), _planned_files(src)) for src in sources]
+    for i, (a, dest_a, files_a) in enumerate(claims):
+        for b, dest_b, files_b in claims[i + 1:]:
+            if dest_a != dest_b and (
+                (files_a is None and _under(dest_b, dest_a)) or (files_b is None and _under(dest_a, dest_b))
+            ):
+                found.append(f"{a['name']} ({dest_a or '.'}/) and {b['name']} ({dest_b or '.'}/) overlap")
+    return found
 
-        category = src.get("category")
-        raw_dest = src.get("dest_dir", "").rstrip("/")
-        if category:
-            full_path = (
-                output_dir / category / raw_dest if raw_dest else output_dir / category
+
+def load_manifest(manifest_path: str | Path) -> List[Dict]:
+    """Read and validate the manifest at *manifest_path*; return its sources."""
+    import yaml
+
+    try:
+        with Path(manifest_path).open(encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+    except yaml.YAMLError as exc:
+        raise ManifestError(manifest_path, [str(exc)]) from None
+    return validate_manifest(config, manifest_path)
+
+
+def build_plan(manifest_path: str | Path, sources: List[Dict]) -> Dict:
+    """What a run over *sources* clones, fetches and writes, without doing any of it.
+
+    Sources are grouped by what they are read from: one clone per repo and
+    branch, one extraction per archive.  The plan is plain data, so it can
+    be saved (``--plan``) and compared between runs.
+    """
+    repos: Dict[Tuple[str, str], Dict] = {}
+    archives: Dict[Tuple[str, int], Dict] = {}
+    plan: Dict = {
+        "manifest": str(manifest_path),
+        "manifest_sha256": _file_digest(Path(manifest_path)),
+        "clones": [], "fetches": [], "archives": [], "local": [], "sources": [],
+        "indices": ["index.md"] + sorted({f"{s['category']}/index.md" for s in sources if s.get("category")}),
+        "overlaps": overlaps(sources),
+    }
+    for src in sources:
+        subdir = src.get("doc_subdir", "").strip("/")
+        reads = (
+            [f"{subdir}/{p['doc_file']}".lstrip("/") for p in src["pages"]]
+            if "pages" in src and src["type"] != "discourse"
+            else [subdir or "."]
+        ) + ["docs/reuse"]
+        if src["type"] == "github":
+            key = (src["repo_url"], src.get("branch", "main"))
+            group = repos.setdefault(key, {"repo_url": key[0], "branch": key[1], "sources": [], "paths": []})
+        elif src["type"] == "archive":
+            key = (src["archive"], src.get("strip_components", 0))
+            group = archives.setdefault(
+                key, {"archive": key[0], "strip_components": key[1], "sources": [], "paths": []}
             )
+            reads += src.get("extract", [])
+        elif src["type"] == "local":
+            plan["local"].append({"source": src["name"], "path": src["path"], "paths": reads})
+            group = None
         else:
-            full_path = output_dir / raw_dest if raw_dest else output_dir
-
-        docs = handler(src, full_path)
-        source_entries.append(
+            group = None
+        if group is not None:
+            group["sources"].append(src["name"])
+            group["paths"] = sorted(set(group["paths"]) | set(reads))
+        if src["type"] == "discourse":
+            plan["fetches"].extend(
+                {"source": src["name"], "url": f"{src['discourse_url']}/raw/{p['topic_id']}"}
+                for p in src["pages"]
+            )
+        plan["sources"].append(
             {
-                "type": stype,
                 "name": src["name"],
-                "category": category,
-                "dest_dir": raw_dest,
-                "docs": docs,
+                "type": src["type"],
+                "category": src.get("category"),
+                "dest": _dest(src),
+                "files": _planned_files(src),  # None: the whole doc_subdir
             }
         )
+    plan["clones"] = list(repos.values())
+    plan["archives"] = list(archives.values())
+    return plan
 
-    build_all_indices(output_dir, source_entries)
-    _write_reuse(Path("."))
+
+def print_plan(plan: Dict) -> None:
+    print(
+        f"[plan] {len(plan['sources'])} sources: {len(plan['clones'])} repos to clone, "
+        f"{len(plan['fetches'])} topics to fetch, {len(plan['archives'])} archives, "
+        f"{len(plan['local'])} local trees"
+    )
+    for repo in plan["clones"]:
+        print(f"[plan] clone {repo['repo_url']}@{repo['branch']} ({', '.join(repo['paths'])})")
+    for archive in plan["archives"]:
+        print(f"[plan] extract {archive['archive']} ({', '.join(archive['paths'])})")
+    for fetch in plan["fetches"]:
+        print(f"[plan] fetch {fetch['url']}")
+    for src in plan["sources"]:
+        files = "whole tree" if src["files"] is None else ", ".join(src["files"])
+        print(f"[plan] {src['name']} → {src['dest'] or '.'}/ ({files})")
+    for overlap in plan["overlaps"]:
+        print(f"[warn] {overlap}")
+
+###############################################################################
+# Run context                                                                 #
+###############################################################################
+
+
+class MergeContext:
+    """State shared by all source handlers during one :func:`merge_docs` run."""
+
+    def __init__(
+        self,
+        workdir: Path,
+        cache_dir: Path | None,
+        cache_size_mb: int | None,
+        sparse: bool = False,
+        http: HttpClient | None = None,
+        offline: bool = False,
+        out: OutputWriter | None = None,
+        timings: RunTimings | None = None,
+        base_dir: Path | None = None,
+        sources: List[Dict] | None = None,
+    ) -> None:
+        self.workdir = workdir
+        self.base_dir = base_dir or Path.cwd()  # local paths are relative to this
+        self.timings = timings or RunTimings()
+        self.out = out or OutputWriter(workdir, timings=self.timings)
+        if cache_dir is None:  # --no-cache: mirrors only live for this run
+            self.mirrors = MirrorCache(workdir, timings=self.timings)
+        else:
+            max_bytes = cache_size_mb * 1024 * 1024 if cache_size_mb is not None else None
+            self.mirrors = MirrorCache(Path(cache_dir).expanduser(), max_bytes, offline, self.timings)
+        self.checkouts = RepoCheckouts(workdir, self.mirrors, sparse)
+        self.topics: Dict[Tuple[str, int], Path] = {}
+        self._graphs: Dict[Path, IncludeGraph] = {}
+        self.http = http or HttpClient(timings=self.timings)
+        self.archives = ArchiveTrees(workdir, self.http, self.base_dir, sources or [], self.timings)
+        self.local_trees: Dict[str, Dict] = {}  # source name -> lockfile entry
+        self.reuse = ReuseAggregator()
+
+    def include_graph(self, root: Path, checkout: Checkout | None = None) -> IncludeGraph:
+        """The include graph shared by all sources served from the tree at *root*."""
+        if root not in self._graphs:
+            self._graphs[root] = IncludeGraph(root, checkout)
+        return self._graphs[root]
+
+
+def _prefetch_sources(sources: List[Dict], ctx: MergeContext, jobs: int) -> None:
+    """Run the network part of every source on a pool of *jobs* threads.
+
+    Handlers still run one after another afterwards, in manifest order, so the
+    merged tree is identical to a serial run.
+    """
+    tasks: List[Callable[[], object]] = []
+    for src in sources:
+        stype = source_type(src.get("type"))
+        if stype is not None and stype.prefetch is not None:
+            tasks.extend(stype.prefetch(src, ctx))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(task) for task in tasks]
+    for fut in futures:
+        fut.result()  # re-raise the first failure in manifest order
+
+
+###############################################################################
+# Orchestrator                                                                #
+###############################################################################
+
+
+def merge_docs(
+    manifest_path: str | Path,
+    output_dir: str | Path,
+    cache_dir: str | Path | None = DEFAULT_CACHE_DIR,
+    cache_size_mb: int | None = DEFAULT_CACHE_SIZE_MB,
+    sparse: bool = False,
+    jobs: int = 1,
+    http_timeout: float = DEFAULT_HTTP_TIMEOUT,
+    http_retries: int = DEFAULT_HTTP_RETRIES,
+    per_host: int = DEFAULT_PER_HOST,
+    offline: bool = False,
+    incremental: bool = False,
+    lockfile: str | Path | None = None,
+    timings_json: str | Path | None = None,
+    profile: str | Path | None = None,
+    copy_mode: str = "auto",
+    dedup: bool = False,
+    lazy: bool = False,
+    on_skeleton: Callable[[], None] | None = None,
+    only: Iterable[str] | None = None,
+) -> RunTimings:
+    """Merge every source listed in *manifest_path* into *output_dir*.
+
+    Repo mirrors are kept under *cache_dir* between runs (``None`` disables the
+    cache); *cache_size_mb* caps its size.  With *sparse*, mirrors are blobless
+    and only the files the handlers read are checked out.  *jobs* > 1 fetches
+    sources concurrently before they are merged.  The ``http_*`` and
+    *per_host* settings configure the shared Discourse :class:`HttpClient`,
+    whose responses are cached under *cache_dir* as well, as are the
+    checkouts of the run, so that *copy_mode* (see :data:`COPY_MODES`) can
+    hardlink or reflink files from them into *output_dir*.  With *dedup*,
+    output files are hardlinks into a content-addressed :class:`BlobStore`.
+    With *lazy*, the indices and placeholder pages are written first (see
+    :func:`write_skeleton`) and *on_skeleton* is called before any source
+    is fetched; *lazy* implies *incremental*.  With *only*, just the named
+    sources are merged again; the files, index entries and reuse fragments
+    of the others are taken over from the previous run's state.  *offline* serves
+    mirrors and Discourse topics from the cache only.  With *incremental*,
+    output files whose content did not change are not rewritten.  Files that
+    an earlier run wrote and no source produces any more are always removed.
+    The resolved commits and topic digests are written to *lockfile*, if given.
+
+    Returns the :class:`RunTimings` of the run, which are also saved to
+    *timings_json* if given.  With *profile*, cProfile statistics of the main
+    thread are dumped there (prefetch workers are not profiled).
+    """
+    if offline and cache_dir is None:
+        raise ValueError("offline mode needs a cache directory")
+    if cache_dir is not None:  # git resolves relative work trees from inside the mirror
+        cache_dir = Path(cache_dir).expanduser().resolve()
+    profiler = cProfile.Profile() if profile is not None else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        timings = _merge_docs(
+            manifest_path, output_dir, cache_dir, cache_size_mb, sparse, jobs,
+            http_timeout, http_retries, per_host, offline, incremental, lockfile, copy_mode,
+            dedup, lazy, on_skeleton, None if only is None else set(only),
+        )
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(str(profile))
+            print(f"[time] cProfile statistics written to {profile}")
+    if timings_json is not None:
+        _write_atomic(Path(timings_json), json.dumps(timings.to_json(), indent=1))
+    return timings
+
+
+def _merge_docs(
+    manifest_path: str | Path,
+    output_dir: str | Path,
+    cache_dir: str | Path | None,
+    cache_size_mb: int | None,
+    sparse: bool,
+    jobs: int,
+    http_timeout: float,
+    http_retries: int,
+    per_host: int,
+    offline: bool,
+    incremental: bool,
+    lockfile: str | Path | None,
+    copy_mode: str,
+    dedup: bool,
+    lazy: bool,
+    on_skeleton: Callable[[], None] | None,
+    only: Set[str] | None,
+) -> RunTimings:
+    sources = load_manifest(manifest_path)  # fail before anything is fetched
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    source_entries: List[Dict] = []
+    timings = RunTimings()
+    timings.declare(src["name"] for src in sources)
+    writer = OutputWriter(output_dir, incremental or lazy, timings, copy_mode, dedup)
+
+    previous: Dict[str, Dict] = {}
+    if only is not None:
+        previous = {e["name"]: e for e in writer.previous_state().get("sources", [])}
+        # sources new to the manifest, or from a state file without file lists
+        only = only | {src["name"] for src in sources if "files" not in previous.get(src["name"], {})}
+
+    placeholders: List[Path] = []
+    if lazy:
+        with timings.stage(RunTimings.RUN, "index"):
+            expected, placeholders = write_skeleton(output_dir, sources, writer)
+        print(f"[lazy] Index skeleton ready ({len(placeholders)} placeholder pages)")
+        if on_skeleton is not None:
+            on_skeleton()
+
+    # Checkouts go next to the cache, which is more likely than /tmp to share
+    # a filesystem with the output (hardlinks and reflinks need that).
+    work_root = Path(cache_dir).expanduser() / "work" if cache_dir is not None else None
+    if work_root is not None:
+        work_root.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=work_root) as tmp:
+        http_cache = HttpCache(Path(cache_dir).expanduser() / "http") if cache_dir is not None else None
+        http = HttpClient(
+            timeout=http_timeout,
+            retries=http_retries,
+            per_host=per_host,
+            cache=http_cache,
+            offline=offline,
+            spool_dir=Path(tmp) / "http",
+            timings=timings,
+        )
+        ctx = MergeContext(
+            Path(tmp), cache_dir, cache_size_mb, sparse, http, offline, writer, timings,
+            base_dir=Path(manifest_path).resolve().parent, sources=sources,
+        )
+        if jobs > 1:
+            _prefetch_sources([s for s in sources if only is None or s["name"] in only], ctx, jobs)
+
+        for src in sources:
+            stype = src["type"]
+            handler = source_type(stype)
+
+            if only is not None and src["name"] not in only:
+                entry = previous[src["name"]]
+                writer.keep(entry.get("files", []))
+                if "reuse" in entry:
+                    ctx.reuse.restore(entry["reuse"])
+                source_entries.append(entry)
+                continue
+
+            full_path, category, raw_dest = _source_dest(src, output_dir)
+            with writer.owned_by(src["name"]):
+                docs = handler.handle(src, full_path, ctx)
+            source_entries.append(
+                {
+                    "type": stype,
+                    "name": src["name"],
+                    "category": category,
+                    "dest_dir": raw_dest,
+                    "docs": docs,
+                    "files": sorted(writer.by_source[src["name"]]),
+                }
+            )
+            if src["name"] in ctx.reuse.by_source:
+                source_entries[-1]["reuse"] = ctx.reuse.by_source[src["name"]]
+            if lazy and docs != expected[len(source_entries) - 1]["docs"]:
+                # the guess was wrong; fix the toctrees before the next source
+                expected[len(source_entries) - 1] = source_entries[-1]
+                with timings.stage(RunTimings.RUN, "index"):
+                    build_all_indices(output_dir, expected, writer)
+
+        with timings.stage(RunTimings.RUN, "reuse"):
+            ctx.reuse.write(output_dir / "reuse", writer)
+        ctx.mirrors.evict()
+        if lockfile is not None:
+            write_lockfile(Path(lockfile), Path(manifest_path), ctx, update=only is not None)
+
+    with timings.stage(RunTimings.RUN, "index"):
+        build_all_indices(output_dir, source_entries, writer)
+    for path in placeholders:  # placeholders no source replaced
+        if path.is_file() and not writer.wrote(path):
+            path.unlink()
+    writer.prune(source_entries)
+    timings.finish()
+    return timings
+
+
+def _detach() -> None:
+    """Return to the shell while a child process fills in the sources."""
+    sys.stdout.flush()
+    if os.fork() != 0:
+        os._exit(0)
 
 
 def main() -> None:
@@ -391,8 +2734,211 @@ def main() -> None:
     p.add_argument(
         "--output", default="docs", help="Destination directory (default: docs/)"
     )
+    p.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help=f"Directory for persistent repo mirrors (default: {DEFAULT_CACHE_DIR})",
+    )
+    p.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Fetch into a temporary mirror that is discarded after the run.",
+    )
+    p.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_MB,
+        metavar="MB",
+        help=f"Evict least recently used mirrors above this size (default: {DEFAULT_CACHE_SIZE_MB})",
+    )
+    p.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Use blobless mirrors and check out only doc_subdir, docs/reuse and include targets.",
+    )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Fetch up to N sources in parallel (default: 1).",
+    )
+    p.add_argument(
+        "--http-timeout",
+        type=float,
+        default=DEFAULT_HTTP_TIMEOUT,
+        metavar="SECONDS",
+        help=f"Timeout for each Discourse request (default: {DEFAULT_HTTP_TIMEOUT:g}).",
+    )
+    p.add_argument(
+        "--http-retries",
+        type=int,
+        default=DEFAULT_HTTP_RETRIES,
+        help=f"Retries on connection errors and 429/5xx responses (default: {DEFAULT_HTTP_RETRIES}).",
+    )
+    p.add_argument(
+        "--per-host",
+        type=int,
+        default=DEFAULT_PER_HOST,
+        metavar="N",
+        help=f"Concurrent requests allowed per host (default: {DEFAULT_PER_HOST}).",
+    )
+    p.add_argument(
+        "--offline",
+        action="store_true",
+        help="Serve repo mirrors and Discourse topics from the cache without network access.",
+    )
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Leave output files whose content is unchanged untouched.",
+    )
+    p.add_argument(
+        "--lockfile",
+        help="Where to record resolved commits and topic digests (default: <manifest>.lock).",
+    )
+    p.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check upstream against the lockfile; exit 0 if nothing changed, 1 if it did, 2 if upstream is unreachable.",
+    )
+    p.add_argument(
+        "--validate",
+        action="store_true",
+        help="Only validate the manifest; exit 0 if it is valid, 1 otherwise.",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print what would be cloned, fetched and written, then stop.",
+    )
+    p.add_argument(
+        "--plan",
+        metavar="PATH",
+        help="Write the execution plan to PATH as JSON ('-' for stdout).",
+    )
+    p.add_argument(
+        "--copy-mode",
+        choices=COPY_MODES,
+        default="auto",
+        help="How files are placed in the output: auto tries reflink, then hardlink, then copy (default: auto).",
+    )
+    p.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Store identical output files once, as hardlinks to read-only blobs.",
+    )
+    p.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Write the indices first, then fill in the sources in the background (implies --incremental).",
+    )
+    p.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and merge sources again whenever they change upstream.",
+    )
+    p.add_argument(
+        "--interval",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help="How often --watch checks upstream (default: 300).",
+    )
+    p.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print wall time, bytes and files per source and stage after the run.",
+    )
+    p.add_argument(
+        "--timings-json",
+        metavar="PATH",
+        help="Write the per-source, per-stage timings to PATH as JSON.",
+    )
+    p.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Dump cProfile statistics of the run to PATH (see python -m pstats).",
+    )
     args = p.parse_args()
-    merge_docs(args.manifest, args.output)
+    if args.offline and args.no_cache:
+        p.error("--offline cannot be combined with --no-cache")
+    if args.watch and (args.offline or args.lazy or args.check):
+        p.error("--watch cannot be combined with --offline, --lazy or --check")
+    lockfile = Path(args.lockfile or Path(args.manifest).with_suffix(".lock"))
+
+    try:
+        sources = load_manifest(args.manifest)
+    except ManifestError as exc:
+        for problem in exc.problems:
+            print(f"[plan] {problem}")
+        sys.exit(f"{args.manifest} is not a valid manifest")
+    if args.validate:
+        for overlap in overlaps(sources):
+            print(f"[warn] {overlap}")
+        print(f"[plan] {args.manifest} is valid ({len(sources)} sources)")
+        sys.exit(0)
+    if args.plan or args.dry_run:
+        plan = build_plan(args.manifest, sources)
+        if args.plan == "-":
+            print(json.dumps(plan, indent=1))
+        elif args.plan:
+            _write_atomic(Path(args.plan), json.dumps(plan, indent=1) + "\n")
+        if args.dry_run:
+            print_plan(plan)
+            sys.exit(0)
+
+    if args.check:
+        # one short try per request: CI waits on this, and a retry storm is no answer
+        client = HttpClient(
+            timeout=min(args.http_timeout, CHECK_TIMEOUT), retries=0, per_host=args.per_host
+        )
+        try:
+            reasons = check_upstream(
+                args.manifest, lockfile, jobs=max(args.jobs, 8), client=client, timeout=CHECK_TIMEOUT
+            )
+        except UpstreamError as exc:
+            print(f"[check] Error: {exc}")
+            sys.exit(2)
+        for reason in reasons:
+            print(f"[check] {reason}")
+        if not reasons:
+            print("[check] Up to date")
+        sys.exit(1 if reasons else 0)
+
+    def run(only: Set[str] | None = None) -> None:
+        timings = merge_docs(
+            args.manifest,
+            args.output,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            cache_size_mb=args.cache_size,
+            sparse=args.sparse,
+            jobs=args.jobs,
+            http_timeout=args.http_timeout,
+            http_retries=args.http_retries,
+            per_host=args.per_host,
+            offline=args.offline,
+            incremental=args.incremental or args.watch,
+            lockfile=lockfile,
+            timings_json=args.timings_json,
+            profile=args.profile,
+            copy_mode=args.copy_mode,
+            dedup=args.dedup,
+            lazy=args.lazy,
+            on_skeleton=_detach if args.lazy else None,
+            only=only,
+        )
+        if args.timings:
+            print(timings.table())
+
+    if args.watch:
+        client = HttpClient(
+            timeout=args.http_timeout, retries=args.http_retries, per_host=args.per_host
+        )
+        watch(args.manifest, lockfile, args.interval, run, jobs=max(args.jobs, 8), client=client)
+    else:
+        run()
 
 
 if __name__ == "__main__":